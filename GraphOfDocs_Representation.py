@@ -1,13 +1,20 @@
 import sys
-import time
-import pickle
+from pathlib import Path
 from neo4j import ServiceUnavailable
 from GraphOfDocs_Representation.neo4j_wrapper import Neo4jDatabase
 from GraphOfDocs_Representation.graph_algos import GraphAlgos
 from GraphOfDocs_Representation.create import *
+from GraphOfDocs_Representation.export import export_graph_of_docs
+from GraphOfDocs_Representation.instrumentation import RunReport
+from GraphOfDocs_Representation.token_cache import TokenCache
+from GraphOfDocs_Representation.community_tags import CommunityTagRanking
 from GraphOfDocs_Representation.select import *
+from GraphOfDocs_Representation.utils import lemmatization_engine
 
-def graphofdocs(create, initialize, dirpath):
+def graphofdocs(create, initialize, dirpath, batch_size = None, export_dir = None, workers = None, checkpoint = None,
+                report_path = 'run_report.json', track_memory = False, cache_dir = None,
+                community_tags_path = None, embeddings_format = 'binary', word2vec = False,
+                delta = False, lemmas_path = None):
     # Open the database.
     try:
         database = Neo4jDatabase('bolt://localhost:7687', 'neo4j', '123')
@@ -19,57 +26,97 @@ def graphofdocs(create, initialize, dirpath):
         input('\t* Press any key to exit the app...')
         sys.exit(1)
 
-    if create:
-        # Delete nodes from previous iterations.
-        database.execute('MATCH (n) DETACH DELETE n', 'w')
+    # Record the time and the counters of each stage, in a json run report.
+    report = RunReport(database, track_memory = track_memory)
+
+    # Share the tokens of the issues between the stages and the runs, if the cache is enabled.
+    cache = None if cache_dir is None else TokenCache(cache_dir)
+
+    # Load the memo of the lemmas of the previous runs, if it is persisted.
+    # The worker processes start with a copy of it, but only the lemmas of this process are saved.
+    if lemmas_path is not None and Path(lemmas_path).is_file():
+        lemmatization_engine.load(lemmas_path)
+
+    if create and export_dir is not None:
+        # Export the whole graph in csv files, which are loaded offline 
+        # into an empty database by the neo4j-admin import tool.
+        with report.stage('export graph'):
+            command = export_graph_of_docs(dirpath, export_dir, 'jira_issues_300.model', 300,
+                                           workers = workers, cache = cache)
+        print(f'Stop the database and run: {command}')
+        print('Then start the database and call create_unique_constraints.')
+
+    elif create:
+        # Delete nodes from previous iterations, unless an interrupted ingestion is resumed
+        # from its checkpoint, or the issues of a delta file are appended to the existing graph.
+        if not delta and (checkpoint is None or not Path(checkpoint).is_file()):
+            database.execute('MATCH (n) DETACH DELETE n', 'w')
 
         # Create uniqueness constraint on key to avoid duplicate word nodes.
         create_unique_constraints(database)
 
         # Create issues from json using the GraphOfDocs model.
-        start = time.perf_counter()
-        create_issues_from_json(database, dirpath)
-        end = time.perf_counter()
-        print(f'Create papers {end-start} sec')
+        with report.stage('create issues'):
+            create_issues_from_json(database, dirpath, batch_size, workers, checkpoint, report, cache, delta)
 
         # Create the similarity graph of topN = 10 similar words using emb. dim. = 300
-        start = time.perf_counter()
-        create_word2vec_similarity_graph(database, dirpath, 'jira_issues_300.model', 300)
-        end = time.perf_counter()
-        print(f'Created similarity graph in {end-start} sec')
+        with report.stage('create similarity graph'):
+            create_word2vec_similarity_graph(database, dirpath, 'jira_issues_300.model', 300, batch_size,
+                                             workers = workers, report = report, cache = cache)
 
     if initialize: # Run initialization functions.
-        # Calculate the word embeddings for the word similarity graph and write them to csv files.
-        with GraphAlgos(database, 'Word', 'similar_w2v', 'Word', rel_weight = 'score') as graph:
-            for dim in [100, 200, 300]:
-                # Generate the embeddings in the database.
-                graph.graphSage(f'gs_{dim}', embedding_dim = dim)
-                graph.node2vec(f'n2v_{dim}', embedding_dim = dim)
-                graph.fastRP(f'fastrp_{dim}', embedding_dim = dim)
-
-                graph.graphSage(f'gs_weighted_{dim}', embedding_dim = dim, rel_weight = 'score')
-                graph.fastRP(f'fastrp_weighted_{dim}', embedding_dim = dim, rel_weight = 'score')
-
-                # Export the embeddings in csv.
-                graph.write_word_embeddings_to_csv(f'gs_{dim}', f'gs_{dim}.csv')
-                graph.write_word_embeddings_to_csv(f'n2v_{dim}', f'n2v_{dim}.csv')
-                graph.write_word_embeddings_to_csv(f'fastrp_{dim}', f'fastrp_{dim}.csv')
-
-                graph.write_word_embeddings_to_csv(f'gs_weighted_{dim}', f'gs_weighted_{dim}.csv')
-                graph.write_word_embeddings_to_csv(f'fastrp_weighted_{dim}', f'fastrp_weighted_{dim}.csv')
-
-        # Construct the Issue similarity graph and calculate its communities.
-        with GraphAlgos(database, 'Issue', 'includes', 'Word') as graph:
-            graph.nodeSimilarity(write_property = 'score', write_relationship = 'is_similar', cutoff = 0.25, top_k = 1)
-        with GraphAlgos(database, 'Issue', 'is_similar', 'Issue') as graph:
-            graph.louvain(write_property = 'community')
-
-        # Save the n top terms of a community of similar document to a pickle.
-        for n in [5, 10, 15, 20, 25, 50, 100, 250, 500, 1000]:
-            x = get_communities_tags(database, top_terms = n)
-            tags = sum(x.values(), [])
-            with open(f'features_{n}.pkl', 'wb') as f:
-                pickle.dump(tags, f)
+        with report.stage('word embeddings') as record:
+            # Calculate the word embeddings for the word similarity graph and export them.
+            # The graph is projected once, and all 15 algorithms are executed on the projection.
+            with GraphAlgos(database, 'Word', 'similar_w2v', 'Word', rel_weight = 'score') as graph:
+                for dim in [100, 200, 300]:
+                    # Generate the embeddings in the database.
+                    graph.graphSage(f'gs_{dim}', embedding_dim = dim)
+                    graph.node2vec(f'n2v_{dim}', embedding_dim = dim)
+                    graph.fastRP(f'fastrp_{dim}', embedding_dim = dim)
+
+                    graph.graphSage(f'gs_weighted_{dim}', embedding_dim = dim, rel_weight = 'score')
+                    graph.fastRP(f'fastrp_weighted_{dim}', embedding_dim = dim, rel_weight = 'score')
+
+                    # Export the embeddings in binary stores (or in csv files, for compatibility).
+                    for write_property in [f'gs_{dim}', f'n2v_{dim}', f'fastrp_{dim}',
+                                           f'gs_weighted_{dim}', f'fastrp_weighted_{dim}']:
+                        if embeddings_format == 'csv':
+                            graph.write_word_embeddings_to_csv(write_property, f'{write_property}.csv')
+                        else:
+                            graph.write_word_embeddings(write_property, write_property,
+                                                        word2vec_path = f'{write_property}.bin' if word2vec else None)
+            # Report the projection time separately from the compute time of each algorithm.
+            record['graph_algos'] = [graph.timings]
+
+        with report.stage('issue communities') as record:
+            # Construct the Issue similarity graph and calculate its communities.
+            with GraphAlgos(database, 'Issue', 'includes', 'Word') as similarity_graph:
+                similarity_graph.nodeSimilarity(write_property = 'score', write_relationship = 'is_similar', cutoff = 0.25, top_k = 1)
+            with GraphAlgos(database, 'Issue', 'is_similar', 'Issue') as community_graph:
+                community_graph.louvain(write_property = 'community')
+            record['graph_algos'] = [similarity_graph.timings, community_graph.timings]
+
+        with report.stage('community tags'):
+            # Rank the terms of every community of similar documents once (or load the ranking
+            # of a previous run of the same graph), and save the n top terms of them to a pickle.
+            ranking = CommunityTagRanking.load_or_select(database, community_tags_path)
+            ranking.export_features([5, 10, 15, 20, 25, 50, 100, 250, 500, 1000], 'features_{n}.pkl')
+
+    # Write the new tokens of the cache.
+    if cache is not None:
+        cache.close()
+        report.count('token_cache_hits', cache.hits)
+        report.count('token_cache_misses', cache.misses)
+
+    # Save the memo of the lemmas for the next runs.
+    if lemmas_path is not None:
+        lemmatization_engine.save(lemmas_path)
+        report.count('lemma_memo_hits', lemmatization_engine.hits)
+        report.count('lemma_memo_misses', lemmatization_engine.misses)
+
+    # Save the run report, to track the performance between releases.
+    report.save(report_path)
     database.close()
     return
 
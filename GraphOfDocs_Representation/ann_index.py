@@ -0,0 +1,274 @@
+"""
+This script contains an approximate nearest neighbour index
+over word embeddings (e.g. word2vec, graphSage, node2vec, fastRP),
+which answers similar word queries without scanning all vectors.
+"""
+import csv
+import json
+import time
+import numpy as np
+from pathlib import Path
+from GraphOfDocs_Representation.embeddings import EmbeddingStore
+
+def normalize(vectors):
+    """
+    Function that returns the float32 unit vectors of the supplied vectors,
+    where the zero vectors are left as they are.
+    """
+    vectors = np.array(vectors, dtype = np.float32, ndmin = 2)
+    norms = np.sqrt((vectors * vectors).sum(axis = 1))
+    norms[norms == 0] = 1
+    return vectors / norms[:, None]
+
+def top_k(scores, k):
+    """
+    Function that returns the indices of the k highest scores, in descending order.
+    """
+    if k < len(scores):
+        best = np.argpartition(-scores, k)[:k]
+    else:
+        best = np.arange(len(scores))
+    return best[np.argsort(-scores[best], kind = 'stable')]
+
+class AnnIndex:
+    """
+    Wrapper class which keeps the normalized word vectors grouped by the cluster
+    of their nearest centroid (an inverted file index), and finds the most similar words
+    of a query by scanning only the clusters of its n_probe nearest centroids.
+    Increasing n_probe increases the recall and the latency of the queries,
+    and scanning all clusters is the same as the exact scan.
+    The arrays are saved in npy files, which are memory-mapped when loaded.
+    """
+    def __init__(self, words, vectors, ids, centroids, offsets):
+        self.words = list(words)
+        self.positions = {word: position for position, word in enumerate(self.words)}
+        # The vectors sorted by cluster, and the position of each vector in words.
+        self.vectors = vectors
+        self.ids = ids
+        self.centroids = centroids
+        # The vectors of cluster i are the ones from offsets[i] to offsets[i + 1].
+        self.offsets = offsets
+        # The position of each word in the sorted vectors.
+        self.slots = np.empty(len(ids), dtype = np.int64)
+        self.slots[ids] = np.arange(len(ids))
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.positions
+
+    @classmethod
+    def build(cls, words, vectors, n_lists = None, iterations = 10, sample_size = 256, seed = 0):
+        """
+        Function that builds the index of the supplied words and their vectors,
+        by clustering the vectors with spherical k-means in n_lists clusters
+        (by default the square root of the number of words). The centroids are trained
+        on a random sample of sample_size vectors per cluster, to bound the build time.
+        """
+        vectors = normalize(vectors)
+        count = len(vectors)
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(count)))
+        n_lists = min(n_lists, count)
+        rng = np.random.RandomState(seed)
+
+        # Train the centroids on a sample of the vectors.
+        sample = vectors
+        if count > sample_size * n_lists:
+            sample = vectors[rng.choice(count, sample_size * n_lists, replace = False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace = False)].copy()
+        for _ in range(iterations):
+            assignments = cls.__assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            sizes = np.bincount(assignments, minlength = n_lists)
+            # Move the centroids of the empty clusters to random vectors.
+            empty = np.flatnonzero(sizes == 0)
+            sums[empty] = sample[rng.choice(len(sample), len(empty))]
+            centroids = normalize(sums)
+
+        # Group the vectors by cluster.
+        assignments = cls.__assign(vectors, centroids)
+        ids = np.argsort(assignments, kind = 'stable')
+        sizes = np.bincount(assignments, minlength = n_lists)
+        offsets = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+        return cls(words, vectors[ids], ids.astype(np.int64), centroids, offsets)
+
+    @staticmethod
+    def __assign(vectors, centroids, block_size = 4096):
+        # Return the nearest centroid of each vector, in blocks to cap memory.
+        return np.concatenate([
+            np.argmax(np.dot(vectors[start:start + block_size], centroids.T), axis = 1)
+            for start in range(0, len(vectors), block_size)
+        ]) if len(vectors) else np.empty(0, dtype = np.int64)
+
+    @classmethod
+    def from_word2vec(cls, model, **options):
+        """
+        Function that builds the index of the vocabulary of a word2vec model.
+        """
+        return cls.build(model.wv.index2word, model.wv.vectors, **options)
+
+    @classmethod
+    def from_embedding_property(cls, database, write_property, **options):
+        """
+        Function that builds the index of the words that have
+        the supplied embedding property (e.g. gs_100, n2v_100, fastrp_100) in the database.
+        """
+        query = (
+            f'MATCH (w:Word) WHERE EXISTS(w.{write_property}) '
+            f'RETURN w.key, w.{write_property}'
+        )
+        words, vectors = zip(*database.stream(query, 'r'))
+        return cls.build(words, vectors, **options)
+
+    @classmethod
+    def from_embedding_csv(cls, filepath, **options):
+        """
+        Function that builds the index of the words of a csv file,
+        which is written by GraphAlgos.write_word_embeddings_to_csv.
+        """
+        words, vectors = [], []
+        with open(filepath, newline = '', encoding = 'utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                words.append(row['word'])
+                vectors.append(json.loads(row['embedding']))
+        return cls.build(words, vectors, **options)
+
+    @classmethod
+    def from_embedding_store(cls, dirpath, **options):
+        """
+        Function that builds the index of the words of a binary store,
+        which is written by GraphAlgos.write_word_embeddings.
+        """
+        store = EmbeddingStore(dirpath)
+        return cls.build(store.words, store.vectors, **options)
+
+    def save(self, dirpath):
+        """
+        Function that saves the index in a directory.
+        """
+        dirpath = Path(dirpath)
+        dirpath.mkdir(parents = True, exist_ok = True)
+        with open(dirpath / 'words.json', 'w', encoding = 'utf-8') as f:
+            json.dump(self.words, f)
+        for name in ['vectors', 'ids', 'centroids', 'offsets']:
+            np.save(dirpath / f'{name}.npy', getattr(self, name))
+
+    @classmethod
+    def load(cls, dirpath, mmap_mode = 'r'):
+        """
+        Function that loads an index from a directory,
+        where the vectors are memory-mapped instead of read in memory.
+        """
+        dirpath = Path(dirpath)
+        with open(dirpath / 'words.json', encoding = 'utf-8') as f:
+            words = json.load(f)
+        arrays = [
+            np.load(dirpath / f'{name}.npy', mmap_mode = mmap_mode)
+            for name in ['vectors', 'ids', 'centroids', 'offsets']
+        ]
+        return cls(words, *arrays)
+
+    def __query_vectors(self, queries):
+        # Return the unit vectors of the queries (words or vectors),
+        # and the slot of each query word (-1 for vectors), which is excluded from its results.
+        slots = np.array([
+            self.slots[self.positions[query]] if isinstance(query, str) else -1 for query in queries
+        ], dtype = np.int64)
+        vectors = normalize([
+            self.vectors[slot] if slot >= 0 else query for query, slot in zip(queries, slots)
+        ])
+        return vectors, slots
+
+    def most_similar(self, query, topn = 10, n_probe = 8):
+        """
+        Function that returns the topn most similar words of a word or vector,
+        along with their cosine similarity, like model.wv.most_similar.
+        """
+        return self.most_similar_batch([query], topn, n_probe)[0]
+
+    def most_similar_batch(self, queries, topn = 10, n_probe = 8):
+        """
+        Function that returns the topn most similar words of many words or vectors at once,
+        by scanning each probed cluster once for all of the queries that probe it.
+        """
+        vectors, slots = self.__query_vectors(queries)
+        n_probe = min(n_probe, len(self.centroids))
+        probes = np.argsort(-np.dot(vectors, self.centroids.T), axis = 1)[:, :n_probe]
+
+        # Gather the candidate positions and scores of each query, cluster by cluster.
+        candidates = [[] for _ in queries]
+        scores = [[] for _ in queries]
+        for cluster in np.unique(probes):
+            members = np.flatnonzero((probes == cluster).any(axis = 1))
+            start, end = self.offsets[cluster], self.offsets[cluster + 1]
+            if start == end:
+                continue
+            block = np.dot(vectors[members], np.asarray(self.vectors[start:end]).T)
+            for member, row in zip(members, block):
+                candidates[member].append(np.arange(start, end))
+                scores[member].append(row)
+
+        results = []
+        for query, slot in enumerate(slots):
+            if not candidates[query]:
+                results.append([])
+                continue
+            found = np.concatenate(candidates[query])
+            dists = np.concatenate(scores[query])
+            # Exclude the query word from its own results.
+            keep = found != slot
+            found, dists = found[keep], dists[keep]
+            best = top_k(dists, topn)
+            results.append([(self.words[self.ids[found[i]]], float(dists[i])) for i in best])
+        return results
+
+    def exact_most_similar_batch(self, queries, topn = 10, block_size = 1024):
+        """
+        Function that returns the topn most similar words of many words or vectors at once,
+        by scanning all vectors, which is the ground truth of the approximate queries.
+        """
+        vectors, slots = self.__query_vectors(queries)
+        results = []
+        for start in range(0, len(vectors), block_size):
+            block = np.dot(vectors[start:start + block_size], np.asarray(self.vectors).T)
+            for dists, slot in zip(block, slots[start:start + block_size]):
+                # Exclude the query word from its own results.
+                if slot >= 0:
+                    dists[slot] = -np.inf
+                best = top_k(dists, min(topn, len(dists) - (slot >= 0)))
+                results.append([(self.words[self.ids[i]], float(dists[i])) for i in best])
+        return results
+
+def benchmark(index, queries, topn = 10, n_probes = (1, 2, 4, 8, 16, 32)):
+    """
+    Function that measures the recall@topn and the queries per second of the index
+    for each n_probe, against the exact scan, on the supplied query words or vectors,
+    and returns them as a list of dicts, where the n_probe of the exact scan is None.
+    """
+    start = time.perf_counter()
+    exact = index.exact_most_similar_batch(queries, topn)
+    end = time.perf_counter()
+    report = [{'n_probe': None, 'recall': 1.0, 'qps': len(queries) / (end - start)}]
+
+    for n_probe in n_probes:
+        start = time.perf_counter()
+        results = index.most_similar_batch(queries, topn, n_probe)
+        end = time.perf_counter()
+        hits = sum(
+            len({word for word, _ in result} & {word for word, _ in truth})
+            for result, truth in zip(results, exact)
+        )
+        total = sum(len(truth) for truth in exact)
+        report.append({
+            'n_probe': n_probe,
+            'recall': hits / total if total else 1.0,
+            'qps': len(queries) / (end - start)
+        })
+
+    for row in report:
+        name = 'exact' if row['n_probe'] is None else f'n_probe={row["n_probe"]}'
+        print(f'{name}: recall@{topn} {row["recall"]:.4f}, {row["qps"]:.1f} queries/sec')
+    return report
@@ -0,0 +1,28 @@
+"""
+This script contains the helpers that are shared by the modules of the package,
+e.g. to split rows in chunks or to memory-map files, which depend only
+on the standard library and numpy, so that any module can import them.
+"""
+import os
+import numpy as np
+from itertools import islice
+
+def chunks(rows, batch_size):
+    """
+    Generator that splits an iterable of rows into lists of at most batch_size rows.
+    """
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def memmap(filepath, dtype):
+    """
+    Function that memory-maps a file as a read-only array of the supplied dtype,
+    unless it is empty, which can't be memory-mapped, where an empty array is returned.
+    """
+    if os.path.getsize(filepath) == 0:
+        return np.empty(0, dtype = dtype)
+    return np.memmap(filepath, dtype = dtype, mode = 'r')
@@ -0,0 +1,136 @@
+"""
+This script contains the ranking of the terms of every community
+of similar documents, which is selected once from the database,
+and then answers the top terms of any number in memory.
+"""
+import os
+import json
+import pickle
+import hashlib
+import numpy as np
+from array import array
+from pathlib import Path
+from GraphOfDocs_Representation.cooccurrence import Vocabulary
+from GraphOfDocs_Representation.select import (
+    get_communities_ranked_tags, get_communities_tags_version, get_papers_communities, get_words_pagerank
+)
+
+def graph_version(database):
+    """
+    Function that returns the version of the graph that the ranking depends on, as a json string:
+    the number of papers, words and includes relationships, and a hash of the community of every paper
+    and the pagerank of every word, so that any new assignment of the communities changes the version.
+    """
+    # The counts are selected in a session, so that an error is raised instead of returning no version.
+    with database.session() as session:
+        [counts] = get_communities_tags_version(session)
+    digest = hashlib.blake2b(digest_size = 16)
+    for records in [get_papers_communities(database), get_words_pagerank(database)]:
+        for record in records:
+            digest.update(json.dumps(record).encode('utf-8'))
+        # Separate the records of the papers from the ones of the words.
+        digest.update(b'\n')
+    return json.dumps(list(counts) + [digest.hexdigest()])
+
+class CommunityTagRanking:
+    """
+    Wrapper class which keeps the full ranking of the terms of every community,
+    as returned by select.get_communities_tags, in compact arrays:
+    the ranked word ids of the i-th community are word_ids[offsets[i]:offsets[i + 1]].
+    The top terms of any number are sliced from the arrays, without querying the database,
+    and the ranking is saved to a file, along with the version of the graph it was selected from.
+    """
+    def __init__(self, communities, words, offsets, word_ids, version = None):
+        self.communities = list(communities)
+        self.words = list(words)
+        self.offsets = np.asarray(offsets, dtype = np.int64)
+        self.word_ids = np.asarray(word_ids, dtype = np.uint32)
+        self.version = version
+
+    def __len__(self):
+        return len(self.communities)
+
+    @classmethod
+    def from_database(cls, database, version = None):
+        """
+        Function that selects the ranking of the terms of every community with a single query.
+        """
+        vocabulary = Vocabulary()
+        communities, offsets, word_ids = [], array('q', [0]), array('I')
+        for community, words in get_communities_ranked_tags(database):
+            communities.append(community)
+            word_ids.extend(vocabulary.add(word) for word in words)
+            offsets.append(len(word_ids))
+        return cls(communities, vocabulary.words, offsets, word_ids, version)
+
+    @classmethod
+    def load_or_select(cls, database, filepath = None):
+        """
+        Function that loads the ranking from a file, if it was selected from the current version of the graph,
+        otherwise it selects the ranking from the database and saves it to the file.
+        If no file is supplied, the ranking is selected without computing the version.
+        """
+        if filepath is None:
+            return cls.from_database(database)
+        version = graph_version(database)
+        if Path(filepath).is_file():
+            ranking = cls.load(filepath)
+            if ranking.version == version:
+                return ranking
+        ranking = cls.from_database(database, version)
+        ranking.save(filepath)
+        return ranking
+
+    def top(self, top_terms = None):
+        """
+        Function that returns the top terms of every community,
+        same as select.get_communities_tags(database, top_terms).
+        """
+        top_tags = {}
+        for index, community in enumerate(self.communities):
+            start, end = self.offsets[index], self.offsets[index + 1]
+            if top_terms is not None:
+                end = min(end, start + top_terms)
+            top_tags[community] = [self.words[id] for id in self.word_ids[start:end]]
+        return top_tags
+
+    def features(self, top_terms = None):
+        """
+        Function that returns the top terms of all communities in one list,
+        in the order of the communities, which may contain duplicates.
+        """
+        return sum(self.top(top_terms).values(), [])
+
+    def export_features(self, top_terms_list, filepath_format = 'features_{n}.pkl'):
+        """
+        Function that saves the features of each number of top terms to a pickle.
+        """
+        for n in top_terms_list:
+            with open(filepath_format.format(n = n), 'wb') as f:
+                pickle.dump(self.features(n), f)
+
+    def save(self, filepath):
+        """
+        Function that saves the ranking to a npz file.
+        """
+        # Write to a temporary file first, so that an interruption doesn't corrupt the ranking.
+        with open(f'{filepath}.tmp', 'wb') as f:
+            np.savez(
+                f, offsets = self.offsets, word_ids = self.word_ids,
+                metadata = np.array(json.dumps({
+                    'communities': self.communities, 'words': self.words, 'version': self.version
+                }))
+            )
+        os.replace(f'{filepath}.tmp', filepath)
+
+    @classmethod
+    def load(cls, filepath):
+        """
+        Function that loads a ranking from a npz file.
+        """
+        with np.load(filepath) as arrays:
+            metadata = json.loads(str(arrays['metadata']))
+            return cls(
+                metadata['communities'], metadata['words'],
+                arrays['offsets'], arrays['word_ids'], metadata['version']
+            )
@@ -0,0 +1,183 @@
+"""
+This script contains the compact structures
+which hold the vocabulary and the co-occurences
+of the graph of words in memory.
+"""
+import numpy as np
+from array import array
+from scipy.sparse import coo_matrix
+
+class Vocabulary:
+    """
+    Wrapper class which interns each unique word to an integer id,
+    based on its order of appearance, and keeps track of
+    the words that have been added since the last call of pop_new().
+    """
+    def __init__(self, words = ()):
+        self.ids = {}
+        self.words = []
+        self.new = 0
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.ids
+
+    def add(self, word):
+        """
+        Function that returns the id of a word,
+        after adding it to the vocabulary if it doesn't exist.
+        """
+        id = self.ids.get(word)
+        if id is None:
+            id = self.ids[word] = len(self.words)
+            self.words.append(word)
+        return id
+
+    def pop_new(self):
+        """
+        Function that returns the words added since its last call.
+        """
+        words = self.words[self.new:]
+        self.new = len(self.words)
+        return words
+
+class CooccurrenceCounter:
+    """
+    Wrapper class which counts the co-occurences (current, next) between word ids,
+    and keeps the connects edges that the cypher queries of create_graph_of_words
+    would store in the database between each pair of words, in array-backed storage.
+    Each unordered pair of ids is packed into a single integer key, which points to a slot
+    of the arrays, where the forward (lower id to higher id) and backward values are kept.
+    If the deltas are tracked, the new edges and the updated weights of the stored edges
+    are returned by pop_deltas(), which is used by the batched writers.
+    """
+    def __init__(self, deltas = True):
+        self.slots = {}
+        self.low = array('I')
+        self.high = array('I')
+        # The counts of each direction, same as the values of the global edges dict.
+        self.counts = (array('I'), array('I'))
+        # The weights of the connects edges of each direction, 0 means that the edge doesn't exist.
+        self.weights = (array('I'), array('I'))
+        # Whether the connects edge of each direction has been returned by pop_deltas().
+        self.stored = (array('B'), array('B'))
+        self.deltas = deltas
+        self.created = []
+        self.updated = set()
+
+    def __len__(self):
+        return len(self.low)
+
+    def __slot(self, low, high):
+        # Return the slot of a pair of ids, after creating it if it doesn't exist.
+        key = low << 32 | high
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.low)
+            self.low.append(low)
+            self.high.append(high)
+            for values in self.counts + self.weights + self.stored:
+                values.append(0)
+        return slot
+
+    def add(self, current, next):
+        """
+        Function that adds a co-occurence between two word ids,
+        updates the connects edges between them, like the MERGE and SET queries
+        of create_graph_of_words do, and returns the new count of the co-occurence.
+        """
+        low, high = (current, next) if current <= next else (next, current)
+        direction = 0 if current <= next else 1
+        slot = self.__slot(low, high)
+
+        count = self.counts[direction][slot] = self.counts[direction][slot] + 1
+        if count > 1:
+            # SET the weight of every edge between the two words, regardless of its direction.
+            for weights in self.weights:
+                if weights[slot]:
+                    weights[slot] = count
+            if self.deltas and (self.stored[0][slot] or self.stored[1][slot]):
+                self.updated.add(slot)
+        elif self.weights[0][slot] != 1 and self.weights[1][slot] != 1:
+            # MERGE creates the edge, unless an edge with a weight of 1 already exists.
+            self.weights[direction][slot] = 1
+            if self.deltas:
+                self.created.append((slot, direction))
+        return count
+
+    def add_stored_edge(self, start, end, weight):
+        """
+        Function that adds a connects edge, which is already stored in the database,
+        e.g. when the counter is recovered from the database. The count of the co-occurence 
+        in its direction is recovered from its weight, which is exact unless 
+        both directions of the pair have co-occured.
+        """
+        low, high = (start, end) if start <= end else (end, start)
+        direction = 0 if start <= end else 1
+        slot = self.__slot(low, high)
+        self.counts[direction][slot] = weight
+        self.weights[direction][slot] = weight
+        self.stored[direction][slot] = 1
+
+    def count(self, current, next):
+        """
+        Function that returns the count of a co-occurence between two word ids.
+        """
+        low, high = (current, next) if current <= next else (next, current)
+        slot = self.slots.get(low << 32 | high)
+        return 0 if slot is None else self.counts[0 if current <= next else 1][slot]
+
+    def __edge(self, slot, direction):
+        # Return the (start, end, weight) of the edge of a slot.
+        if direction == 0:
+            return self.low[slot], self.high[slot], self.weights[0][slot]
+        return self.high[slot], self.low[slot], self.weights[1][slot]
+
+    def pop_deltas(self):
+        """
+        Function that returns the updated weights of the stored edges, as (low, high, weight) rows,
+        and the new edges, as (start, end, weight) rows, since its last call.
+        The new edges are then considered as stored.
+        """
+        updated = []
+        for slot in self.updated:
+            # All stored edges between the two words have the same weight.
+            direction = 0 if self.stored[0][slot] else 1
+            updated.append((self.low[slot], self.high[slot], self.weights[direction][slot]))
+        created = []
+        for slot, direction in self.created:
+            created.append(self.__edge(slot, direction))
+            self.stored[direction][slot] = 1
+        self.created = []
+        self.updated = set()
+        return updated, created
+
+    def edges(self):
+        """
+        Generator that yields all connects edges as (start, end, weight) rows.
+        """
+        for slot in range(len(self.low)):
+            for direction in (0, 1):
+                if self.weights[direction][slot]:
+                    yield self.__edge(slot, direction)
+
+    def to_sparse_matrix(self, size = None):
+        """
+        Function that returns the co-occurence counts as a sparse word-word matrix,
+        where the element (i, j) is the count of the co-occurence (current i, next j).
+        """
+        low = np.frombuffer(self.low, dtype = np.uint32)
+        high = np.frombuffer(self.high, dtype = np.uint32)
+        if size is None:
+            size = int(high.max()) + 1 if len(high) else 0
+        rows = np.concatenate((low, high))
+        columns = np.concatenate((high, low))
+        counts = np.concatenate([np.frombuffer(values, dtype = np.uint32) for values in self.counts])
+        matrix = coo_matrix((counts, (rows, columns)), shape = (size, size)).tocsr()
+        # Remove the zero counts of the directions that never co-occured.
+        matrix.eliminate_zeros()
+        return matrix
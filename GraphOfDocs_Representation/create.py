@@ -2,19 +2,62 @@
 This script contains functions that 
 create data in the Neo4j database.
 """
-import json
-import platform
+import os
+import pickle
 from pathlib import Path
 from gensim.models import Word2Vec
-from GraphOfDocs_Representation.utils import (
-    clear_screen, generate_words
+from GraphOfDocs_Representation.cooccurrence import (
+    CooccurrenceCounter, Vocabulary
 )
+from GraphOfDocs_Representation.instrumentation import RunReport
+from GraphOfDocs_Representation.similarity import word2vec_most_similar_all
+from GraphOfDocs_Representation.json_stream import read_issues
+from GraphOfDocs_Representation.common import chunks
+from GraphOfDocs_Representation.utils import generate_words_batch, generate_words_parallel
+
+# Initialize an empty vocabulary of unique terms, which interns them to integer ids.
+# The ids preserve the order of appearance of the terms.
+vocabulary = Vocabulary()
+# Initialize an empty counter of the co-occurences between the terms.
+cooccurrences = CooccurrenceCounter(deltas = False)
+
+def window_pairs(words, window_size = 4):
+    """
+    Generator that yields the co-occurrences (current, next) of a graph of words,
+    by sliding a window of the specified size over the words of a document,
+    without connecting words of different sentences.
+    """
+    length = len(words)
+    for i, current in enumerate(words):
+        # If there are leftover items smaller than the window size, reduce it.
+        if i + window_size > length:
+            window_size = window_size - 1
+        # If the current word is the end of sentence string,
+        # we need to skip it, in order to go to the words of the next sentence,
+        # without connecting words of different sentences, in the database.
+        if current == 'e5c':
+            continue
+        # Connect the current element with the next elements of the window size.
+        for j in range(1, window_size):
+            next = words[i + j]
+            # Reached the end of sentence string.
+            # We can't connect words of different sentences,
+            # therefore we need to pick a new current word,
+            # by going back out to the outer loop.
+            if next == 'e5c':
+                break
+            yield current, next
 
-# Initialize an empty set of edges.
-edges = {}
-# Initialize an empty list of unique terms.
-# We are using a list to preserver order of appearance.
-nodes = []
+def unique_terms(words):
+    """
+    Function that returns the unique terms of a graph of words,
+    based on their order of appearance, without the end-of-sentence token.
+    """
+    terms = list(dict.fromkeys(words))
+    # Remove end-of-sentence token, so it doesn't get created.
+    if 'e5c' in terms:
+        terms.remove('e5c')
+    return terms
 
 def create_graph_of_words(words, database, filename, relationship, window_size = 4):
     """
@@ -29,67 +72,40 @@ def create_graph_of_words(words, database, filename, relationship, window_size =
         # Early exit, we return the skipped filename
         return filename
 
-    # We are using a global set of edges to avoid creating duplicate edges between different graph of words.
+    # We are using a global counter of co-occurences to avoid creating duplicate edges between different graph of words.
     # Basically the co-occurences will be merged.
-    global edges
+    global cooccurrences
 
-    # We are using a global set of edges to avoid creating duplicate nodes between different graph of words.
-    # A list is being used to respect the order of appearance.
-    global nodes
+    # We are using a global vocabulary to avoid creating duplicate nodes between different graph of words.
+    # The vocabulary respects the order of appearance.
+    global vocabulary
 
     # We are getting the unique terms for the current graph of words.
-    terms = []
-    creation_list = []
-    for word in words:
-        if word not in terms: 
-            terms.append(word)
-    # Remove end-of-sentence token, so it doesn't get created.
-    if 'e5c' in terms:
-        terms.remove('e5c')
-    # If the word doesn't exist as a node, then add it to the creation list.
+    terms = unique_terms(words)
+    # Add the words to the global vocabulary, to avoid duplicate creation.
     for word in terms:
-        if word not in nodes:
-            creation_list.append(word)
-            # Append word to the global node graph, to avoid duplicate creation.
-            nodes.append(word)
+        vocabulary.add(word)
+    # The words that didn't exist as nodes, form the creation list.
+    creation_list = vocabulary.pop_new()
 
     # Create all unique nodes, from the creation list.
     database.execute(f'UNWIND {creation_list} as key '
                       'CREATE (word:Word {key: key})', 'w')
 
     # Create unique connections between existing nodes of the graph.
-    for i, current in enumerate(words):
-        # If there are leftover items smaller than the window size, reduce it.
-        if i + window_size > length:
-            window_size = window_size - 1
-        # If the current word is the end of sentence string,
-        # we need to skip it, in order to go to the words of the next sentence,
-        # without connecting words of different sentences, in the database.
-        if current == 'e5c':
-            continue
-        # Connect the current element with the next elements of the window size.
-        for j in range(1, window_size):
-            next = words[i + j]
-            # Reached the end of sentence string.
-            # We can't connect words of different sentences,
-            # therefore we need to pick a new current word,
-            # by going back out to the outer loop.
-            if next == 'e5c':
-                break
-            edge = (current, next)
-            if edge in edges:
-                # If the edge, exists just update its weight.
-                edges[edge] = edges[edge] + 1
-                query = (f'MATCH (w1:Word {{key: "{current}"}})-[r:connects]-(w2:Word {{key: "{next}"}}) '
-                         f'SET r.weight = {edges[edge]}')
-            else:
-                # Else, create it, with a starting weight of 1 meaning first co-occurence.
-                edges[edge] = 1
-                query = (f'MATCH (w1:Word {{key: "{current}"}}) '
-                         f'MATCH (w2:Word {{key: "{next}"}}) '
-                         f'MERGE (w1)-[r:connects {{weight: {edges[edge]}}}]-(w2)')
-            # This line of code, is meant to be executed, in both cases of the if...else statement.
-            database.execute(query, 'w')
+    for current, next in window_pairs(words, window_size):
+        weight = cooccurrences.add(vocabulary.ids[current], vocabulary.ids[next])
+        if weight > 1:
+            # If the edge, exists just update its weight.
+            query = (f'MATCH (w1:Word {{key: "{current}"}})-[r:connects]-(w2:Word {{key: "{next}"}}) '
+                     f'SET r.weight = {weight}')
+        else:
+            # Else, create it, with a starting weight of 1 meaning first co-occurence.
+            query = (f'MATCH (w1:Word {{key: "{current}"}}) '
+                     f'MATCH (w2:Word {{key: "{next}"}}) '
+                     f'MERGE (w1)-[r:connects {{weight: {weight}}}]-(w2)')
+        # This line of code, is meant to be executed, in both cases of the if...else statement.
+        database.execute(query, 'w')
 
     # Connect the paper, with all of its words.
     query = (f'MATCH (w:Word) WHERE w.key IN {terms} '
@@ -100,6 +116,190 @@ def create_graph_of_words(words, database, filename, relationship, window_size =
     database.execute(query, 'w')
     return
 
+class GraphOfWordsBatch:
+    """
+    Wrapper class which gathers the issues, word nodes, includes and connects edges
+    of many graph of words in memory, and writes them in the database, by using
+    a few parameterized UNWIND queries per batch, instead of one query per co-occurence.
+    The resulting graph is identical to the one created by create_graph_of_words.
+    The writes of a batch are idempotent, so a batch that was interrupted can be written again,
+    and the state of the batches can be saved to and loaded from a checkpoint file.
+    If a checkpoint file is supplied, it is saved by flush() every checkpoint_every batches,
+    right after the keys of the written issues are recorded. The batches written after
+    the last checkpoint are added and written again on resume, which sets the same weights,
+    since the co-occurences are restored to the ones of the checkpoint.
+    """
+    def __init__(self, database, relationship = 'includes', window_size = 4, batch_size = 1000, write_size = 10000,
+                 checkpoint = None, checkpoint_every = 10):
+        self.database = database
+        self.relationship = relationship
+        self.window_size = window_size
+        self.batch_size = batch_size
+        # The maximum number of rows written by each transaction.
+        self.write_size = write_size
+        # The words that have been added as nodes, which provides the new words of each batch.
+        self.vocabulary = Vocabulary()
+        # The co-occurences of all graph of words, which provides the new edges 
+        # and the updated weights of the existing edges of each batch.
+        self.cooccurrences = CooccurrenceCounter()
+        # The keys of the issues that have been written in the database.
+        self.keys = set()
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        # The number of batches written since the last checkpoint.
+        self.unsaved = 0
+        self.clear()
+
+    def __len__(self):
+        return len(self.issues)
+
+    def clear(self):
+        """
+        Function that empties the rows of the current batch.
+        """
+        self.issues = []
+        self.includes = []
+
+    def add(self, issue, words):
+        """
+        Function that adds an issue, its assignee and its graph of words to the current batch,
+        and writes the batch in the database, once it reaches the batch size.
+        """
+        self.issues.append({
+            'key': str(issue['key']),
+            'type': str(issue['type']),
+            'priority': str(issue['priority']),
+            'status': str(issue['status']),
+            'assignee': str(issue['assignee'])
+        })
+        self.add_graph_of_words(words, str(issue['key']))
+        if len(self.issues) >= self.batch_size:
+            self.flush()
+
+    def add_graph_of_words(self, words, filename):
+        """
+        Function that adds the word nodes, the connects edges and the includes edges
+        of a graph of words to the current batch, following create_graph_of_words.
+        """
+        # Files that have word length < window size, are skipped.
+        if len(words) < self.window_size:
+            # Early exit, we return the skipped filename
+            return filename
+
+        # Add the words to the vocabulary, the new ones will be created.
+        terms = unique_terms(words)
+        for word in terms:
+            self.vocabulary.add(word)
+
+        ids = self.vocabulary.ids
+        for current, next in window_pairs(words, self.window_size):
+            self.cooccurrences.add(ids[current], ids[next])
+
+        # Connect the issue, with all of its words.
+        self.includes.append({'key': filename, 'terms': terms})
+        return
+
+    def __write(self, session, query, rows):
+        # Skip the round trip to the database, if there is nothing to write.
+        if rows:
+            session.execute_many(query, rows, self.write_size)
+
+    def flush(self):
+        """
+        Function that writes the current batch in the database and empties it.
+        All queries of the batch share one session, and each one writes
+        its rows in chunks of write_size rows, which are retried by the driver
+        on transient errors, while any other error is raised.
+        """
+        with self.database.session() as session:
+            # Create the issues, their assignees and the connections between them.
+            self.__write(session,
+                         'MERGE (i:Issue {key: row.key}) '
+                         'ON CREATE SET i.type = row.type, i.priority = row.priority, i.status = row.status',
+                         self.issues)
+            self.__write(session,
+                         'MERGE (p:Person {uname: row.assignee})',
+                         self.issues)
+            self.__write(session,
+                         'MATCH (p:Person {uname: row.assignee}) '
+                         'MATCH (i:Issue {key: row.key}) '
+                         'MERGE (p)-[r:is_assigned_to]->(i)',
+                         self.issues)
+
+            # Create all unique nodes, from the creation list.
+            self.__write(session,
+                         'MERGE (word:Word {key: row})',
+                         self.vocabulary.pop_new())
+
+            # Update the weights of the existing edges, before creating the new ones.
+            words = self.vocabulary.words
+            updated, created = self.cooccurrences.pop_deltas()
+            self.__write(session,
+                         'MATCH (w1:Word {key: row[0]})-[r:connects]-(w2:Word {key: row[1]}) '
+                         'SET r.weight = row[2]',
+                         [[words[start], words[end], weight] for start, end, weight in updated])
+            self.__write(session,
+                         'MATCH (w1:Word {key: row[0]}) '
+                         'MATCH (w2:Word {key: row[1]}) '
+                         'MERGE (w1)-[r:connects]->(w2) '
+                         'SET r.weight = row[2]',
+                         [[words[start], words[end], weight] for start, end, weight in created])
+
+            # Connect the issues, with all of their words.
+            self.__write(session,
+                         'MATCH (i:Issue {key: row.key}) '
+                         'UNWIND row.terms AS term '
+                         'MATCH (w:Word {key: term}) '
+                        f'MERGE (i)-[:{self.relationship}]->(w)',
+                         self.includes)
+        self.keys.update(issue['key'] for issue in self.issues)
+        self.clear()
+        self.unsaved += 1
+        # Save the checkpoint in the same step as the keys of the batch,
+        # every checkpoint_every batches, to bound the size of the checkpoint writes.
+        if self.checkpoint is not None and self.unsaved >= self.checkpoint_every:
+            self.save(self.checkpoint)
+
+    def save(self, filepath):
+        """
+        Function that saves the vocabulary, the co-occurences and the keys
+        of the written issues to a checkpoint file. It should be called after flush(),
+        so that the checkpoint matches the database.
+        """
+        # Write to a temporary file first, so that an interruption doesn't corrupt the checkpoint.
+        with open(f'{filepath}.tmp', 'wb') as f:
+            pickle.dump((self.vocabulary, self.cooccurrences, self.keys), f)
+        os.replace(f'{filepath}.tmp', filepath)
+        self.unsaved = 0
+
+    def load(self, filepath):
+        """
+        Function that loads the vocabulary, the co-occurences and the keys
+        of the written issues from a checkpoint file.
+        """
+        with open(filepath, 'rb') as f:
+            self.vocabulary, self.cooccurrences, self.keys = pickle.load(f)
+        self.clear()
+
+    def load_from_database(self):
+        """
+        Function that recovers the vocabulary, the co-occurences and the keys
+        of the written issues from a graph that exists in the database,
+        e.g. when it has been created without a checkpoint file.
+        """
+        self.vocabulary = Vocabulary(
+            key for [key] in self.database.stream('MATCH (w:Word) RETURN w.key ORDER BY id(w)', 'r')
+        )
+        # The recovered words already exist as nodes.
+        self.vocabulary.pop_new()
+        self.cooccurrences = CooccurrenceCounter()
+        ids = self.vocabulary.ids
+        query = 'MATCH (w1:Word)-[r:connects]->(w2:Word) RETURN w1.key, w2.key, r.weight'
+        for start, end, weight in self.database.stream(query, 'r'):
+            self.cooccurrences.add_stored_edge(ids[start], ids[end], weight)
+        self.keys = {key for [key] in self.database.stream('MATCH (i:Issue) RETURN i.key', 'r')}
+        self.clear()
+
 def create_unique_constraints(database):
     """
     Wrapper function that gathers all CREATE CONSTRAINT queries,
@@ -113,38 +313,119 @@ def create_unique_constraints(database):
                      'ASSERT person.uname IS UNIQUE', 'w')
     return
 
-def create_issues_from_json(database, dirpath):
+def get_issue_text(issue):
+    """
+    Function that returns the title and description of an issue,
+    where the missing ones are replaced by empty strings.
+    """
+    title = '' if issue.get('title') is None else issue['title']
+    description = '' if issue.get('description') is None else issue['description']
+    return title, description
+
+def tokenize_issues(issues, workers = None, cache = None, chunk_size = 100):
+    """
+    Generator that yields each issue along with the words of its title and description.
+    The issues are tokenized in chunks of chunk_size issues by generate_words_batch.
+    If the number of workers is supplied, the issues are tokenized 
+    by a pool of processes, while preserving their order.
+    If a TokenCache is supplied, the words of the cached texts are read from it,
+    and the words of the rest are added to it.
+    """
+    if workers is None:
+        # Tokenize the issues in chunks, by using the batched tokenizer.
+        tokenize = generate_words_batch if cache is None else cache.generate_words_batch
+        for chunk in chunks(issues, chunk_size):
+            yield from zip(chunk, tokenize([' '.join(get_issue_text(issue)) for issue in chunk]))
+    else:
+        yield from generate_words_parallel(
+            issues, lambda issue: ' '.join(get_issue_text(issue)), workers, cache = cache
+        )
+
+def create_issues_from_json(database, dirpath, batch_size = None, workers = None, checkpoint = None,
+                            report = None, cache = None, delta = False, checkpoint_every = 10):
     """
     Function that creates the nodes representing issues,
     persons assigned to them, sets the properties of the
     first ones, and create the correspending graph of docs
     by using the title and description of the issue,
     based on the supplied json file.
+    If a batch size is supplied, the issues are written
+    in batches of that size, by using a GraphOfWordsBatch.
+    If the number of workers is supplied, the issues are tokenized
+    by a pool of processes, while they are written in the database.
+    If a checkpoint file is supplied, the issues are written in batches,
+    the checkpoint is saved every checkpoint_every batches, and the issues that already
+    exist in the graph are skipped. The checkpoint is loaded if it exists, 
+    otherwise the state is recovered from the database. This resumes 
+    an interrupted ingestion, or appends the new issues of a delta file 
+    to the graph, by updating the weights of the affected edges.
+    If delta is enabled, the issues are appended to the graph in the same way,
+    without a checkpoint file, by recovering the state from the database.
+    The progress and the counters are recorded in the supplied RunReport.
+    If a TokenCache is supplied, the words of the issues are cached in it.
     """
-    current_system = platform.system()
-    
-    # Read json in memory.
-    with open(dirpath, encoding = 'utf-8-sig', errors = 'ignore') as f:
-        issues = json.load(f)['issues']
+    report = RunReport() if report is None else report
 
     skip_count = 0
+    exist_count = 0
     count = 1
-    total_count = len(issues)
 
-    # Process all issues.
-    for issue in issues:
+    # The checkpointed ingestion and the delta ingestion are always batched.
+    resume = checkpoint is not None or delta
+    if resume and batch_size is None:
+        batch_size = 1000
+
+    # Gather the issues in memory, if the batched ingestion is enabled.
+    batch = None if batch_size is None else GraphOfWordsBatch(
+        database, 'includes', batch_size = batch_size, checkpoint = checkpoint, checkpoint_every = checkpoint_every
+    )
+
+    # Load the state of the previous ingestion from the checkpoint or the database.
+    if resume:
+        if checkpoint is not None and Path(checkpoint).is_file():
+            batch.load(checkpoint)
+        else:
+            batch.load_from_database()
+
+    # Count the words and the pairs of co-occurring words added by this ingestion.
+    terms, pairs = (vocabulary, cooccurrences) if batch is None else (batch.vocabulary, batch.cooccurrences)
+    terms_count, pairs_count = len(terms), len(pairs)
+
+    def new_issues(issues):
+        # Skip the issues that already exist in the graph, before they are tokenized.
+        nonlocal exist_count
+        for issue in issues:
+            if str(issue['key']) in batch.keys:
+                exist_count += 1
+                continue
+            yield issue
+
+    # Process all issues, by reading them one at a time from the json file.
+    issues = read_issues(dirpath) if not resume else new_issues(read_issues(dirpath))
+    for issue, words in tokenize_issues(issues, workers, cache):
         # Print the number of the currently processed issue.
-        print(f'Processing {count + skip_count} out of {total_count} issues...' )
+        report.progress(f'Processing issue {count + skip_count + exist_count}...')
 
         # Extract the title and description from the issue.
-        title = '' if issue.get('title') is None else issue['title']
-        description = '' if issue.get('description') is None else issue['description']
+        title, description = get_issue_text(issue)
 
         # If the issue has no title and description, continue.
         if title == '' and description == '':
             skip_count += 1
             continue
 
+        if batch is not None:
+            # Add the issue and the words of its title and description to the batch.
+            batch.add(issue, words)
+            last_key = issue['key']
+            count = count + 1
+
+            # Save the last accessed issue in a file, once its batch is written.
+            if len(batch) == 0:
+                with open('last_accessed_issue.txt', 'w') as f:
+                    f.write(issue['key'])
+            continue
+
         # Create the issue, using its fields.
         query = (
                 f'CREATE (i:Issue {{key: "{issue["key"]}", '
@@ -166,11 +447,8 @@ def create_issues_from_json(database, dirpath):
         )
         database.execute(query, 'w')
 
-        # Join the text of the title and description.
-        text = ' '.join((title, description))
-
         # Create the graph of words representation from the text of the issue.
-        create_graph_of_words(generate_words(text), database, issue['key'], 'includes')
+        create_graph_of_words(words, database, issue['key'], 'includes')
 
         # Update the progress counter.
         count = count + 1
@@ -179,47 +457,160 @@ def create_issues_from_json(database, dirpath):
         with open('last_accessed_issue.txt', 'w') as f:
             f.write(issue['key'])
 
-        # Clear the screen to output the update the progress counter.
-        clear_screen(current_system)
-
-    print(f'Created {total_count - skip_count}, skipped {skip_count} issues.')
+    # Write the remaining issues of the last batch, and the final checkpoint.
+    if batch is not None and len(batch) > 0:
+        batch.flush()
+        with open('last_accessed_issue.txt', 'w') as f:
+            f.write(last_key)
+    if checkpoint is not None and batch.unsaved > 0:
+        batch.save(checkpoint)
+
+    report.count('issues', count - 1)
+    report.count('skipped_issues', skip_count)
+    report.count('existing_issues', exist_count)
+    report.count('words', len(terms) - terms_count)
+    report.count('word_pairs', len(pairs) - pairs_count)
+    print(f'Created {count - 1}, skipped {skip_count}, already existing {exist_count} issues.')
     return
 
-def train_word2vec(dirpath, model_name, size):
-    # Read json in memory.
-    with open(dirpath, encoding = 'utf-8-sig', errors = 'ignore') as f:
-        issues = json.load(f)['issues']
-
-    # Generate a list of lists, where each inner list 
-    # contains the tokens of each text.
-    texts = [
-        generate_words(' '.join((
+def get_word2vec_texts(dirpath, cache = None, keys = None, chunk_size = 1000):
+    """
+    Function that returns the keys and the tokens of the texts of the issues,
+    which the word2vec model is trained on, optionally only for the supplied keys.
+    The issues are streamed, and their texts are tokenized in chunks of chunk_size texts.
+    If a TokenCache is supplied, the tokens of the cached texts are read from it.
+    """
+    tokenize = generate_words_batch if cache is None else cache.generate_words_batch
+    # Keep only the key and the text of each issue, while they are streamed,
+    # and tokenize the texts in chunks.
+    items = (
+        (str(issue['key']), ' '.join((
             str(issue.get('title', '')),
             str(issue.get('description', ''))
-        ))) for issue in issues
-    ]
+        ))) for issue in read_issues(dirpath) if keys is None or str(issue['key']) in keys
+    )
+    issue_keys, texts = [], []
+    for chunk in chunks(items, chunk_size):
+        chunk_keys, chunk_texts = zip(*chunk)
+        issue_keys.extend(chunk_keys)
+        texts.extend(tokenize(list(chunk_texts)))
+    return issue_keys, texts
+
+def save_word2vec_keys(model_name, keys):
+    """
+    Function that saves the keys of the issues that a word2vec model is trained on,
+    next to the model, so that the issues added to the graph later are detected.
+    """
+    with open(f'{model_name}.keys.tmp', 'wb') as f:
+        pickle.dump(set(keys), f)
+    os.replace(f'{model_name}.keys.tmp', f'{model_name}.keys')
+
+def get_untrained_keys(database, model_name):
+    """
+    Function that returns the keys of the issues of the graph that the word2vec model
+    isn't trained on, e.g. the ones of a delta file. If the keys of the model
+    weren't saved (e.g. by an older version), the model is considered up to date.
+    """
+    if not Path(f'{model_name}.keys').is_file():
+        return set()
+    with open(f'{model_name}.keys', 'rb') as f:
+        trained = pickle.load(f)
+    return {key for [key] in database.stream('MATCH (i:Issue) RETURN i.key', 'r')} - trained
+
+def train_word2vec(dirpath, model_name, size, cache = None):
+    # Generate a list of lists, where each inner list 
+    # contains the tokens of each text, by reading one issue at a time.
+    keys, texts = get_word2vec_texts(dirpath, cache)
 
     # Train the Word2Vec model on the texts of jira issues.
     model = Word2Vec(texts, size = size, window = 5, min_count = 1, workers = 8)
     model.save(f'{model_name}')
+    save_word2vec_keys(model_name, keys)
 
-def create_word2vec_similarity_graph(database, dirpath, model_name, size = 100):
-    # If the file doesn't exist, train the word2vec model.
-    if not Path(model_name).is_file():
-        train_word2vec(dirpath, model_name, size)
+def update_word2vec(dirpath, model_name, keys, cache = None):
+    """
+    Function that updates a trained word2vec model with the texts of the issues of the supplied keys,
+    by adding their new words to its vocabulary and training it on their texts.
+    """
+    model = Word2Vec.load(model_name)
+    with open(f'{model_name}.keys', 'rb') as f:
+        trained = pickle.load(f)
+    keys, texts = get_word2vec_texts(dirpath, cache, keys)
+    if texts:
+        model.build_vocab(texts, update = True)
+        model.train(texts, total_examples = len(texts), epochs = model.epochs)
+        model.save(f'{model_name}')
+    save_word2vec_keys(model_name, trained.union(keys))
+
+def delete_similarity_graph(database, batch_size = 10000):
+    """
+    Function that deletes the similar_w2v edges, in transactions of batch_size edges,
+    before the ones of a new or updated word2vec model are written.
+    """
+    with database.session() as session:
+        query = 'MATCH ()-[r:similar_w2v]->() WITH r LIMIT $limit DELETE r RETURN count(r)'
+        while session.execute(query, 'w', {'limit': batch_size})[0][0] == batch_size:
+            continue
 
-    current_system = platform.system()
+def create_word2vec_similarity_graph(database, dirpath, model_name, size = 100,
+                                     batch_size = None, block_size = 128, workers = None, report = None,
+                                     cache = None):
+    """
+    Function that connects each word with its 10 most similar words,
+    based on a word2vec model, which is trained if it doesn't exist.
+    If the model exists, it is updated with the issues that were added to the graph
+    after it was trained (e.g. by a delta file), and the edges of the previous model are deleted.
+    The edges are merged, so that the stage can be run again (e.g. on resume) without duplicates.
+    If a batch size is supplied, the most similar words of all words
+    are computed at once, by multiplying blocks of block_size vectors
+    in a number of threads, and the similar_w2v edges are written
+    by using an UNWIND query per batch of that many edges.
+    The progress and the counters are recorded in the supplied RunReport.
+    """
+    report = RunReport() if report is None else report
+
+    # If the file doesn't exist, train the word2vec model, otherwise update it with the new issues.
+    # The edges of the previous model are deleted first, so that an interruption leaves no stale edges.
+    keys = None if not Path(model_name).is_file() else get_untrained_keys(database, model_name)
+    if keys is None:
+        delete_similarity_graph(database)
+        with report.stage('train word2vec'):
+            train_word2vec(dirpath, model_name, size, cache)
+    elif keys:
+        delete_similarity_graph(database)
+        with report.stage('update word2vec'):
+            update_word2vec(dirpath, model_name, keys, cache)
 
     # Load the word2vec model
     model = Word2Vec.load(model_name)
-    
+
+    if batch_size is not None:
+        # Find the most similar terms of all tokens at once.
+        with report.stage('find most similar words'):
+            similarities = word2vec_most_similar_all(model, 10, block_size, workers)
+
+        def rows():
+            for token, terms in similarities:
+                report.count('tokens')
+                report.count('edges', len(terms))
+                yield from ([token, term, score] for term, score in terms)
+
+        # Create the similarity relationships in batches.
+        with report.stage('write similar_w2v edges'):
+            database.execute_many('MATCH (token:Word {key: row[0]}) '
+                                  'MATCH (term:Word {key: row[1]}) '
+                                  'MERGE (token)-[r:similar_w2v]->(term) '
+                                  'SET r.score = row[2]',
+                                  rows(), batch_size)
+        return
+
     # Initialize variables.
     count = 0
     total_count = len(model.wv.vocab)
 
     # Find all tokens in the vocabulary and their most similar terms.
     for token in model.wv.vocab:
-        print(f'Processing {count} out of {total_count} tokens...' )
+        report.progress(f'Processing {count} out of {total_count} tokens...')
         for term, score in model.wv.most_similar(token, topn = 10):
             # Create the similarity relationship between 
             # the token and each of its terms, 
@@ -227,10 +618,11 @@ def create_word2vec_similarity_graph(database, dirpath, model_name, size = 100):
             query = (
                 f'MATCH (token:Word {{key: "{token}"}}) '
                 f'MATCH (term:Word {{key: "{term}"}}) '
-                f'CREATE (token)-[r:similar_w2v{{score: {score}}}]->(term)'
+                f'MERGE (token)-[r:similar_w2v]->(term) '
+                f'SET r.score = {score}'
             )
             database.execute(query, 'w')
+            report.count('edges')
 
-        # Clear the screen to output the update the progress counter.
-        clear_screen(current_system)
+        report.count('tokens')
         count += 1
@@ -0,0 +1,129 @@
+"""
+This script contains the binary export of word embeddings,
+which writes them in a float32 matrix file with a vocabulary index,
+that is memory-mapped when loaded, instead of parsing a csv file.
+"""
+import os
+import json
+import numpy as np
+from pathlib import Path
+from GraphOfDocs_Representation.common import chunks, memmap
+
+# The vectors are stored as little-endian float32, same as the word2vec binary format.
+dtype = np.dtype('<f4')
+
+def write_embeddings(dirpath, rows, chunk_size = 10000, word2vec_path = None):
+    """
+    Function that writes the (word, vector) rows in the files of a directory, in chunks of chunk_size rows:
+    vectors.f32 holds the vectors one after the other as float32, words.json the word of each vector,
+    and meta.json the number and the dimension of the vectors. If a word2vec_path is supplied,
+    the vectors are also written in the word2vec binary format. Returns the number of vectors.
+    """
+    dirpath = Path(dirpath)
+    dirpath.mkdir(parents = True, exist_ok = True)
+    words, dim = [], None
+    # Remove meta.json of a previous export first, and write it last, so that an interrupted export
+    # doesn't leave a store whose words and vectors are mixed with the previous ones.
+    if (dirpath / 'meta.json').is_file():
+        os.remove(dirpath / 'meta.json')
+    with open(dirpath / 'vectors.f32.tmp', 'wb') as f:
+        for chunk in chunks(rows, chunk_size):
+            chunk_words, vectors = zip(*chunk)
+            vectors = np.asarray(vectors, dtype = dtype)
+            if dim is None:
+                dim = vectors.shape[1] if vectors.ndim == 2 else 0
+            if vectors.ndim != 2 or vectors.shape[1] != dim:
+                raise ValueError(f'The vectors of {dirpath} must all have {dim} dimensions!')
+            vectors.tofile(f)
+            words.extend(chunk_words)
+
+    os.replace(dirpath / 'vectors.f32.tmp', dirpath / 'vectors.f32')
+    with open(dirpath / 'words.json', 'w', encoding = 'utf-8') as f:
+        json.dump(words, f)
+    with open(dirpath / 'meta.json.tmp', 'w', encoding = 'utf-8') as f:
+        json.dump({'count': len(words), 'dim': dim or 0, 'dtype': dtype.str}, f)
+    os.replace(dirpath / 'meta.json.tmp', dirpath / 'meta.json')
+
+    if word2vec_path is not None:
+        EmbeddingStore(dirpath).to_word2vec(word2vec_path, chunk_size)
+    return len(words)
+
+def export_word_embeddings(database, write_property, dirpath, chunk_size = 10000, word2vec_path = None):
+    """
+    Function that exports the words that have the supplied embedding property
+    (e.g. gs_100, n2v_100, fastrp_100) in the database, same as GraphAlgos.write_word_embeddings_to_csv,
+    but in the binary files of write_embeddings, while they are streamed from the database.
+    """
+    query = (
+        f'MATCH (w:Word) WHERE EXISTS(w.{write_property}) '
+        f'RETURN w.key, w.{write_property}'
+    )
+    return write_embeddings(
+        dirpath, database.stream(query, 'r', fetch_size = chunk_size), chunk_size, word2vec_path
+    )
+
+class EmbeddingStore:
+    """
+    Wrapper class which reads the vectors written by write_embeddings from a memory map of their file,
+    so that the vector of a word is returned as a read-only view of the map, without parsing or copying it.
+    """
+    def __init__(self, dirpath):
+        self.dirpath = Path(dirpath)
+        with open(self.dirpath / 'meta.json', encoding = 'utf-8') as f:
+            meta = json.load(f)
+        with open(self.dirpath / 'words.json', encoding = 'utf-8') as f:
+            self.words = json.load(f)
+        self.positions = {word: position for position, word in enumerate(self.words)}
+        self.vectors = memmap(self.dirpath / 'vectors.f32', np.dtype(meta['dtype'])) \
+                         .reshape(meta['count'], meta['dim'])
+
+    @staticmethod
+    def exists(dirpath):
+        """
+        Function that checks whether a directory holds a completely written store.
+        """
+        return (Path(dirpath) / 'meta.json').is_file()
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.positions
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def vector(self, word):
+        """
+        Function that returns the vector of a word, as a view of the memory map.
+        """
+        return self.vectors[self.positions[word]]
+
+    def rows(self, words):
+        """
+        Function that returns the rows of many words in the matrix of the vectors.
+        """
+        return np.array([self.positions[word] for word in words], dtype = np.int64)
+
+    def to_word2vec(self, filepath, chunk_size = 10000):
+        """
+        Function that writes the vectors in the word2vec binary format,
+        which is loaded by gensim's KeyedVectors.load_word2vec_format(filepath, binary = True).
+        """
+        with open(f'{filepath}.tmp', 'wb') as f:
+            f.write(f'{len(self)} {self.dim}\n'.encode('utf-8'))
+            for start in range(0, len(self), chunk_size):
+                vectors = self.vectors[start:start + chunk_size]
+                for word, vector in zip(self.words[start:start + chunk_size], vectors):
+                    f.write(word.encode('utf-8') + b' ' + vector.tobytes() + b'\n')
+        os.replace(f'{filepath}.tmp', filepath)
+
+    def to_csv(self, filepath):
+        """
+        Function that writes the vectors in a csv file, same as GraphAlgos.write_word_embeddings_to_csv.
+        """
+        with open(filepath, 'w', encoding = 'utf-8-sig', errors = 'ignore') as file:
+            file.write('idx,word,embedding\n')
+            for i, (word, vector) in enumerate(zip(self.words, self.vectors)):
+                file.write(f'{i},{word},"{vector.astype(float).tolist()}"\n')
@@ -0,0 +1,187 @@
+"""
+This script contains functions that export
+the GraphOfDocs graph into csv files, which are
+loaded offline by the neo4j-admin import tool.
+"""
+import csv
+from collections import Counter
+from pathlib import Path
+from gensim.models import Word2Vec
+from GraphOfDocs_Representation.cooccurrence import CooccurrenceCounter
+from GraphOfDocs_Representation.create import (
+    GraphOfWordsBatch, get_issue_text, tokenize_issues, train_word2vec
+)
+from GraphOfDocs_Representation.similarity import word2vec_most_similar_all
+from GraphOfDocs_Representation.json_stream import read_issues
+
+# The header of each csv file, in the neo4j-admin import format.
+headers = {
+    'issues': ['key:ID(Issue)', 'type', 'priority', 'status'],
+    'persons': ['uname:ID(Person)'],
+    'words': ['key:ID(Word)'],
+    'is_assigned_to': [':START_ID(Person)', ':END_ID(Issue)'],
+    'includes': [':START_ID(Issue)', ':END_ID(Word)'],
+    'connects': [':START_ID(Word)', ':END_ID(Word)', 'weight:long'],
+    'similar_w2v': [':START_ID(Word)', ':END_ID(Word)', 'score:double']
+}
+
+# The label or relationship type of each csv file.
+labels = {
+    'issues': 'Issue', 'persons': 'Person', 'words': 'Word',
+    'is_assigned_to': 'is_assigned_to', 'includes': 'includes',
+    'connects': 'connects', 'similar_w2v': 'similar_w2v'
+}
+
+class GraphOfDocsExport(GraphOfWordsBatch):
+    """
+    Wrapper class which computes the nodes and relationships of the GraphOfDocs graph
+    entirely in memory, by following the same steps as GraphOfWordsBatch,
+    and writes them in csv files instead of the database.
+    """
+    def __init__(self, outdir, relationship = 'includes', window_size = 4, batch_size = 1000):
+        super().__init__(None, relationship, window_size, batch_size)
+        # The connects edges are written once, so their deltas aren't needed.
+        self.cooccurrences = CooccurrenceCounter(deltas = False)
+        self.outdir = Path(outdir)
+        self.outdir.mkdir(parents = True, exist_ok = True)
+        self.files = {}
+        self.writers = {}
+        for name, header in headers.items():
+            self.files[name] = open(self.outdir / f'{name}.csv', 'w', newline = '', encoding = 'utf-8')
+            self.writers[name] = csv.writer(self.files[name])
+            self.writers[name].writerow(header)
+        # The issue keys and unames that have already been written, to avoid duplicate nodes.
+        self.issue_keys = set()
+        self.unames = set()
+
+    def flush(self):
+        """
+        Function that writes the issues, persons, words and includes edges
+        of the current batch in the csv files and empties it.
+        The connects edges are written by close(), since their weights
+        are final only after all issues have been added.
+        """
+        for issue in self.issues:
+            if issue['key'] not in self.issue_keys:
+                self.issue_keys.add(issue['key'])
+                self.writers['issues'].writerow([issue['key'], issue['type'], issue['priority'], issue['status']])
+            if issue['assignee'] not in self.unames:
+                self.unames.add(issue['assignee'])
+                self.writers['persons'].writerow([issue['assignee']])
+            self.writers['is_assigned_to'].writerow([issue['assignee'], issue['key']])
+
+        self.writers['words'].writerows([word] for word in self.vocabulary.pop_new())
+        for include in self.includes:
+            self.writers['includes'].writerows([include['key'], term] for term in include['terms'])
+        self.clear()
+
+    def add_word2vec_similarities(self, model, topn = 10, block_size = 128, workers = None):
+        """
+        Function that writes the similar_w2v edges between each word of the graph
+        and its most similar words, based on the supplied word2vec model,
+        which are found for all words at once by word2vec_most_similar_all.
+        """
+        for token, terms in word2vec_most_similar_all(model, topn, block_size, workers):
+            # Only words that exist as nodes are connected, same as the MATCH queries.
+            if token not in self.vocabulary:
+                continue
+            self.writers['similar_w2v'].writerows(
+                [token, term, score] for term, score in terms
+                if term in self.vocabulary
+            )
+
+    def close(self):
+        """
+        Function that writes the remaining batch and the connects edges,
+        and closes the csv files.
+        """
+        self.flush()
+        words = self.vocabulary.words
+        self.writers['connects'].writerows(
+            [words[start], words[end], weight] for start, end, weight in self.cooccurrences.edges()
+        )
+        for file in self.files.values():
+            file.close()
+
+    # These methods enable the use of this class in a with statement.
+    def __enter__(self):
+        return self
+
+    # Automatic cleanup of the opened files of this class.
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+def export_graph_of_docs(dirpath, outdir, model_name, size = 100, batch_size = 1000, workers = None, cache = None):
+    """
+    Function that creates the csv files of the whole GraphOfDocs graph,
+    i.e. the issues, persons, words, and their is_assigned_to, includes,
+    connects and similar_w2v relationships, without using the database.
+    Returns the neo4j-admin import command that loads them.
+    """
+    with GraphOfDocsExport(outdir, 'includes', batch_size = batch_size) as export:
+        # Read the issues one at a time from the json file.
+        for issue, words in tokenize_issues(read_issues(dirpath), workers, cache):
+            # If the issue has no title and description, continue.
+            if get_issue_text(issue) == ('', ''):
+                continue
+            export.add(issue, words)
+
+        # If the file doesn't exist, train the word2vec model.
+        if not Path(model_name).is_file():
+            train_word2vec(dirpath, model_name, size, cache)
+        export.add_word2vec_similarities(Word2Vec.load(model_name))
+
+    return import_command(outdir)
+
+def import_command(outdir, database = 'neo4j'):
+    """
+    Function that returns the neo4j-admin import command,
+    which loads the exported csv files into an empty database.
+    """
+    outdir = Path(outdir)
+    nodes = ' '.join(
+        f'--nodes={labels[name]}={outdir / name}.csv'
+        for name in ['issues', 'persons', 'words']
+    )
+    relationships = ' '.join(
+        f'--relationships={labels[name]}={outdir / name}.csv'
+        for name in ['is_assigned_to', 'includes', 'connects', 'similar_w2v']
+    )
+    return (f'neo4j-admin import --database={database} '
+            f'--multiline-fields=true {nodes} {relationships}')
+
+def read_export(outdir):
+    """
+    Function that reads the exported csv files back,
+    and returns the rows of each file, without their header.
+    """
+    rows = {}
+    for name in headers:
+        with open(Path(outdir) / f'{name}.csv', newline = '', encoding = 'utf-8') as f:
+            rows[name] = list(csv.reader(f))[1:]
+    return rows
+
+def compare_export_with_database(database, outdir):
+    """
+    Function that compares the exported csv files with the graph
+    created by the transactional path (e.g. on a small corpus),
+    and returns the names of the files that differ from the database.
+    """
+    queries = {
+        'issues': 'MATCH (i:Issue) RETURN i.key, i.type, i.priority, i.status',
+        'persons': 'MATCH (p:Person) RETURN p.uname',
+        'words': 'MATCH (w:Word) RETURN w.key',
+        'is_assigned_to': 'MATCH (p:Person)-[:is_assigned_to]->(i:Issue) RETURN p.uname, i.key',
+        'includes': 'MATCH (i:Issue)-[:includes]->(w:Word) RETURN i.key, w.key',
+        'connects': 'MATCH (w1:Word)-[r:connects]->(w2:Word) RETURN w1.key, w2.key, r.weight',
+        'similar_w2v': 'MATCH (w1:Word)-[r:similar_w2v]->(w2:Word) RETURN w1.key, w2.key, r.score'
+    }
+    mismatches = []
+    for name, rows in read_export(outdir).items():
+        # Compare the multisets of the rows, using the text representation of each value,
+        # which is how they are written in the csv files.
+        exported = Counter(tuple(row) for row in rows)
+        stored = Counter(tuple(str(value) for value in row) for row in database.execute(queries[name], 'r'))
+        if exported != stored:
+            mismatches.append(name)
+    return mismatches
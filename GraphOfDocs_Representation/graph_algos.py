@@ -1,5 +1,6 @@
 import time
 import json
+import uuid
 import traceback
 import numpy as np
 
@@ -8,11 +9,17 @@ from sklearn import preprocessing
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import classification_report
+from GraphOfDocs_Representation.embeddings import export_word_embeddings
 
 class GraphAlgos:
     """
     Wrapper class which handle the graph algorithms 
     more efficiently, by abstracting repeating code.
+    The graph is projected once in the graph catalog, as a named graph,
+    on which all algorithms are executed, and it is dropped at the end of the with statement.
+    The algorithms can either write their results to the database, or mutate
+    the named graph (mode = 'mutate'), so that the next algorithms use them,
+    and the projection time and the compute time of each algorithm are recorded in timings.
     """
     database = None # Static variable shared across objects.
 
@@ -24,10 +31,10 @@ class GraphAlgos:
         # Initialize the optional parameter.
         end = end if end is not None else start
 
-        # Construct the projection of the anonymous graph.
-        self.graph_projection = (
-            f'{{nodeProjection: ["{start}", "{end}"], '
-             'relationshipProjection: {'
+        # Construct the projection of the named graph.
+        self.node_projection = json.dumps(list(dict.fromkeys([start, end])))
+        self.relationship_projection = (
+             '{'
             f'{relationship}: {{'
             f'type: "{relationship}", '
             f'orientation: "{orientation}"'
@@ -35,58 +42,107 @@ class GraphAlgos:
         
         # If the relationship weight property exists, then set it. 
         if rel_weight is not None:
-            self.graph_projection += f', properties: "{rel_weight}"'
-
-        # Add two right brackets to complete the query.
-        self.graph_projection += '}}'
+            self.relationship_projection += f', properties: "{rel_weight}"'
+
+        # Add two right brackets to complete the projection.
+        self.relationship_projection += '}}'
+
+        # The name of the graph is set once it is projected.
+        self.graph_name = None
+        self.timings = {'projection_sec': None, 'projection_millis': None, 'algorithms': []}
+
+    def project(self):
+        """
+        Function that projects the graph in the graph catalog, unless it is already projected,
+        and returns its name.
+        """
+        if self.graph_name is None:
+            graph_name = f'graphofdocs_{uuid.uuid4().hex}'
+            start = time.perf_counter()
+            result = GraphAlgos.database.execute(
+                f'CALL gds.graph.create("{graph_name}", {self.node_projection}, {self.relationship_projection}) '
+                 'YIELD createMillis', 'w'
+            )
+            self.timings['projection_sec'] = time.perf_counter() - start
+            self.timings['projection_millis'] = result[0][0] if result else None
+            self.graph_name = graph_name
+        return self.graph_name
+
+    def drop(self):
+        """
+        Function that drops the graph from the graph catalog, if it is projected.
+        """
+        if self.graph_name is not None:
+            GraphAlgos.database.execute(f'CALL gds.graph.drop("{self.graph_name}") YIELD graphName', 'w')
+            self.graph_name = None
+
+    def __run(self, procedure, setup, millis = 'computeMillis', arguments = None):
+        # Execute a procedure on the named graph, with the setup map (or other arguments),
+        # and record its wall time and its compute time.
+        graph_name = self.project()
+        arguments = arguments if arguments is not None else f'{{{setup}}}'
+        start = time.perf_counter()
+        result = GraphAlgos.database.execute(f'CALL {procedure}("{graph_name}", {arguments}) YIELD {millis}', 'w')
+        self.timings['algorithms'].append({
+            'procedure': procedure,
+            'wall_sec': time.perf_counter() - start,
+            'compute_millis': result[0][0] if result else None
+        })
+        return self
 
-    def pagerank(self, write_property, max_iterations = 20, damping_factor = 0.85):
-        setup = (f'{self.graph_projection}, '
-            f'writeProperty: "{write_property}", '
+    @staticmethod
+    def __check_mode(mode):
+        if mode not in ('write', 'mutate'):
+            raise TypeError('Algorithm mode can either be write or mutate!')
+        return mode
+
+    def pagerank(self, write_property, max_iterations = 20, damping_factor = 0.85, mode = 'write'):
+        setup = (
+            f'{self.__check_mode(mode)}Property: "{write_property}", '
             f'maxIterations: {max_iterations}, '
-            f'dampingFactor: {damping_factor}}}'
+            f'dampingFactor: {damping_factor}'
         )
-        GraphAlgos.database.execute(f'CALL gds.pageRank.write({setup})', 'w')
+        return self.__run(f'gds.pageRank.{mode}', setup)
 
-    def nodeSimilarity(self, write_property, write_relationship, cutoff = 0.5, top_k = 10):
-        setup = (f'{self.graph_projection}, '
-            f'writeProperty: "{write_property}", '
-            f'writeRelationshipType: "{write_relationship}", '
+    def nodeSimilarity(self, write_property, write_relationship, cutoff = 0.5, top_k = 10, mode = 'write'):
+        setup = (
+            f'{self.__check_mode(mode)}Property: "{write_property}", '
+            f'{mode}RelationshipType: "{write_relationship}", '
             f'similarityCutoff: {cutoff}, '
-            f'topK: {top_k}}}'
+            f'topK: {top_k}'
         )
-        GraphAlgos.database.execute(f'CALL gds.nodeSimilarity.write({setup})', 'w')
+        return self.__run(f'gds.nodeSimilarity.{mode}', setup)
 
-    def louvain(self, write_property, max_levels = 10, max_iterations = 10):
-        setup = (f'{self.graph_projection}, '
-            f'writeProperty: "{write_property}", '
+    def louvain(self, write_property, max_levels = 10, max_iterations = 10, mode = 'write'):
+        setup = (
+            f'{self.__check_mode(mode)}Property: "{write_property}", '
             f'maxLevels: {max_levels}, '
-            f'maxIterations: {max_iterations}}}'
+            f'maxIterations: {max_iterations}'
         )
-        GraphAlgos.database.execute(f'CALL gds.louvain.write({setup})', 'w')
+        return self.__run(f'gds.louvain.{mode}', setup)
 
     def node2vec(self, write_property, embedding_dim = 100, iterations = 1, walk_length = 80,
-                 walks_per_node = 10, window_size = 10, walk_buffer_size = 1000):
-        setup = (f'{self.graph_projection}, '
-            f'writeProperty: "{write_property}", '
+                 walks_per_node = 10, window_size = 10, walk_buffer_size = 1000, mode = 'write'):
+        setup = (
+            f'{self.__check_mode(mode)}Property: "{write_property}", '
             f'embeddingDimension: {embedding_dim}, '
             f'iterations: {iterations}, '
             f'walkLength: {walk_length}, '
             f'walksPerNode: {walks_per_node}, '
             f'windowSize: {window_size}, '
-            f'walkBufferSize: {walk_buffer_size}}}'
+            f'walkBufferSize: {walk_buffer_size}'
         )
-        GraphAlgos.database.execute(f'CALL gds.alpha.node2vec.write({setup})', 'w')
+        return self.__run(f'gds.alpha.node2vec.{mode}', setup)
 
     def graphSage(self, write_property, rel_weight = None, embedding_dim = 64, epochs = 1,
-                  max_iterations = 10, aggregator = 'mean', activation_function = 'sigmoid'):
+                  max_iterations = 10, aggregator = 'mean', activation_function = 'sigmoid', mode = 'write'):
 
         # The community edition of the Neo4j Graph Data Science Library allows only one model to be stored in the database.
         model_exists = GraphAlgos.database.execute('CALL gds.beta.model.exists("graphSage") YIELD exists', 'r')[0][0]
         if model_exists: # then drop the model from the database.
             GraphAlgos.database.execute('CALL gds.beta.model.drop("graphSage")', 'r')
 
-        train_setup = (f'{self.graph_projection}, '
+        train_setup = (
             f'embeddingDimension: {embedding_dim}, '
             f'epochs: {epochs}, '
             f'modelName: "graphSage", '
@@ -100,24 +156,21 @@ class GraphAlgos:
         if rel_weight is not None:
             train_setup += f', relationshipWeightProperty: "{rel_weight}"'
 
-        # Add a right bracket to complete the query.
-        train_setup += '}' 
-
-        write_setup = (f'{self.graph_projection}, '
-            f'writeProperty: "{write_property}", '
-            f'modelName: "graphSage"}}'
+        write_setup = (
+            f'{self.__check_mode(mode)}Property: "{write_property}", '
+            f'modelName: "graphSage"'
         )
 
-        GraphAlgos.database.execute(f'CALL gds.beta.graphSage.train({train_setup})', 'w')
-        GraphAlgos.database.execute(f'CALL gds.beta.graphSage.write({write_setup})', 'w')
+        self.__run('gds.beta.graphSage.train', train_setup, 'trainMillis')
+        return self.__run(f'gds.beta.graphSage.{mode}', write_setup)
 
-    def fastRP(self, write_property, rel_weight = None, embedding_dim = 100, iterations = 10):
+    def fastRP(self, write_property, rel_weight = None, embedding_dim = 100, iterations = 10, mode = 'write'):
         # Construct the iteration weights vector,  its first element is 0.0 and the rest are 1.0.
         # The length of the vector determines the amount of iterations by the algorithm.
         iteration_weights = [0.0] + [1.0] * (iterations - 1)
 
-        setup = (f'{self.graph_projection}, '
-            f'writeProperty: "{write_property}", '
+        setup = (
+            f'{self.__check_mode(mode)}Property: "{write_property}", '
             f'embeddingDimension: {embedding_dim}, '
             f'iterationWeights: {iteration_weights}'
         )
@@ -126,10 +179,16 @@ class GraphAlgos:
         if rel_weight is not None:
             setup += f', relationshipWeightProperty: "{rel_weight}"'
 
-        # Add a right bracket to complete the query.
-        setup += '}'
+        return self.__run(f'gds.fastRP.{mode}', setup)
 
-        GraphAlgos.database.execute(f'CALL gds.fastRP.write({setup})', 'w')
+    def write_node_properties(self, properties):
+        """
+        Function that writes node properties of the named graph (e.g. the ones of the algorithms
+        executed in mutate mode) to the database, with a single procedure.
+        """
+        return self.__run(
+            'gds.graph.writeNodeProperties', None, 'writeMillis', json.dumps(list(properties))
+        )
 
     @staticmethod
     def get_embeddings(write_property):
@@ -148,9 +207,17 @@ class GraphAlgos:
         )
         with open(filepath, 'w', encoding = 'utf-8-sig', errors = 'ignore') as file:
             file.write('idx,word,embedding\n')
-            for i, (word, embedding) in enumerate(GraphAlgos.database.execute(query, 'r')):
+            for i, (word, embedding) in enumerate(GraphAlgos.database.stream(query, 'r')):
                 file.write(f'{i},{word},"{embedding}"\n')
 
+    @staticmethod
+    def write_word_embeddings(write_property, dirpath, chunk_size = 10000, word2vec_path = None):
+        """
+        Function that exports the word embeddings of a property in a binary, memory-mappable store
+        (see embeddings.write_embeddings), which is loaded by embeddings.EmbeddingStore.
+        """
+        return export_word_embeddings(GraphAlgos.database, write_property, dirpath, chunk_size, word2vec_path)
+
     @staticmethod
     def train_classifier(embeddings):
         # Unpack the embeddings and the assignees in X and Y separately.
@@ -177,9 +244,11 @@ class GraphAlgos:
 
     # These methods enable the use of this class in a with statement.
     def __enter__(self):
+        self.project()
         return self
 
     # Automatic cleanup of the created graph of this class.
     def __exit__(self, exc_type, exc_value, tb):
+        self.drop()
         if exc_type is not None:
             traceback.print_exception(exc_type, exc_value, tb)
@@ -0,0 +1,95 @@
+"""
+This script contains the runners of the link prediction features
+of many pairs of authors, which compute them in chunks,
+concurrently in many sessions (or locally, on an exported graph),
+and write them to a csv file.
+"""
+import csv
+import time
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from GraphOfDocs_Representation.common import chunks
+from GraphOfDocs_Representation.select import create_graph_features
+
+# The columns of the features, in the order of the columns of the datasets.
+columns = [
+    'node1', 'node2', 'adamic_adar', 'common_neighbors',
+    'preferential_attachment', 'total_neighbors', 'similarity', 'label'
+]
+
+def _features_of_chunk(database, chunk, train_set):
+    # Compute the features of a chunk of pairs in its own session,
+    # so that the chunks are executed concurrently, each one in a short transaction.
+    with database.session() as session:
+        return create_graph_features(session, chunk, train_set)
+
+def extract_graph_features(database, pairs, filepath, train_set = True, chunk_size = 1000, workers = 4, report = None):
+    """
+    Function that computes the link prediction features of (node1, node2, label) pairs,
+    same as create_graph_features, in chunks of chunk_size pairs, which are executed
+    by up to workers concurrent sessions. The features are written to a csv file
+    while they arrive, in the order of the pairs, and at most 2 * workers chunks
+    are kept in memory. Returns the number of pairs and the pairs per second.
+    If a RunReport is supplied, the pairs and the features are counted in it.
+    """
+    def write(chunk, future):
+        # Write the features of a chunk, once they are computed.
+        nonlocal count
+        rows = future.result()
+        writer.writerows(rows)
+        count += len(chunk)
+        if report is not None:
+            report.count('pairs', len(chunk))
+            report.count('features', len(rows))
+            report.progress(f'{count} pairs, {count / (time.perf_counter() - start):.1f} pairs/sec')
+
+    count = 0
+    start = time.perf_counter()
+    with open(filepath, 'w', newline = '', encoding = 'utf-8') as f, \
+         ThreadPoolExecutor(max_workers = workers) as executor:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        pending = deque()
+        for chunk in chunks(([int(node1), int(node2), int(label)] for node1, node2, label in pairs), chunk_size):
+            pending.append((chunk, executor.submit(_features_of_chunk, database, chunk, train_set)))
+            # Wait for the oldest chunk, so that the chunks in memory are bounded.
+            if len(pending) >= 2 * workers:
+                write(*pending.popleft())
+        while pending:
+            write(*pending.popleft())
+
+    rate = count / (time.perf_counter() - start)
+    print(f'{filepath}: {count} pairs, {rate:.1f} pairs/sec')
+    return count, rate
+
+def extract_local_graph_features(graph, pairs, filepath, similarity_graph = None, chunk_size = 100000, workers = 1):
+    """
+    Function that computes the link prediction features of (node1, node2, label) pairs,
+    same as extract_graph_features, on a CoauthorGraph exported from the database,
+    without any queries. The similarity is the weight of the relationship of each pair
+    in the similarity graph (e.g. is_similar_early, exported with its score), if it is supplied.
+    Unlike the queries, the pairs of nodes that don't exist in the database aren't skipped.
+    Returns the number of pairs and the pairs per second.
+    """
+    start = time.perf_counter()
+    pairs = np.array([[int(node1), int(node2), int(label)] for node1, node2, label in pairs], dtype = np.int64).reshape(-1, 3)
+    scores = graph.link_prediction_features(pairs[:, 0], pairs[:, 1], chunk_size, workers)
+    similarities = np.full(len(pairs), np.nan)
+    if similarity_graph is not None:
+        similarities = similarity_graph.edge_weights(pairs[:, 0], pairs[:, 1])
+
+    with open(filepath, 'w', newline = '', encoding = 'utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for index, (node1, node2, label) in enumerate(pairs.tolist()):
+            # The missing similarities are written as empty values, same as the null scores of the queries.
+            similarity = '' if np.isnan(similarities[index]) else similarities[index]
+            writer.writerow([
+                node1, node2, scores['adamic_adar'][index], scores['common_neighbors'][index],
+                scores['preferential_attachment'][index], scores['total_neighbors'][index], similarity, label
+            ])
+
+    rate = len(pairs) / (time.perf_counter() - start)
+    print(f'{filepath}: {len(pairs)} pairs, {rate:.1f} pairs/sec')
+    return len(pairs), rate
@@ -1,4 +1,3 @@
-import time
 import traceback
 import networkx as nx
 import pandas as pd
@@ -7,6 +6,7 @@ import os
 import random
 
 from neo4j.types.graph import Node, Relationship
+from GraphOfDocs_Representation.instrumentation import RunReport
 from node2vec import Node2Vec
 
 import stellargraph as sg
@@ -38,35 +38,32 @@ class inMemoryGraph:
     """
     database = None # Static variable shared across objects.
 
-    def __init__(self, database):
+    def __init__(self, database, report = None):
         # Initialize the static variable and class member.
         if inMemoryGraph.database is None:
             inMemoryGraph.database = database
+        report = RunReport(database) if report is None else report
         
-        # Return the GraphOfDocs graph.
+        # Return the GraphOfDocs graph, one record at a time.
         query = 'MATCH (w:Word)-[r:connects]->(w2:Word) RETURN *'
-        start = time.perf_counter()
-        data = database.execute(query, 'g')
-        end = time.perf_counter()
-        print(f'Retrieving data {end-start} sec')
-
-        start = time.perf_counter()
-        # Construct the networkX Graph.
-        self.G = nx.MultiDiGraph()
-
-        for d in data:
-            for entry in d.values():
-                # Parse node.
-                if isinstance(entry, Node):
-                    self.__add_node(entry)
-
-                # Parse link.
-                elif isinstance(entry, Relationship):
-                    self.__add_edge(entry)
-                else:
-                    raise TypeError("Unrecognized object")
-        end = time.perf_counter()
-        print(f'Constructing the in-memory graph {end-start} sec')
+        data = database.stream(query, 'g')
+
+        with report.stage('construct in-memory graph'):
+            # Construct the networkX Graph, while the records are received.
+            self.G = nx.MultiDiGraph()
+
+            for d in data:
+                report.count('records')
+                for entry in d.values():
+                    # Parse node.
+                    if isinstance(entry, Node):
+                        self.__add_node(entry)
+
+                    # Parse link.
+                    elif isinstance(entry, Relationship):
+                        self.__add_edge(entry)
+                    else:
+                        raise TypeError("Unrecognized object")
 
     # Private method that adds a node.
     def __add_node(self, node):
@@ -0,0 +1,150 @@
+"""
+This script contains the instrumentation of the pipeline,
+which measures the time, counters and memory of its stages,
+and reports them in a machine-readable json file.
+"""
+import sys
+import json
+import time
+import platform
+import tracemalloc
+from contextlib import contextmanager
+
+class RunReport:
+    """
+    Wrapper class which records named stages of a run, along with their wall time,
+    CPU time, counters (e.g. issues, words, edges, queries), the throughput of each counter,
+    and optionally their peak traced memory. The progress of a stage is printed
+    at most once per interval, on a single line, instead of clearing the screen.
+    If a database is supplied, the queries executed during each stage are counted.
+    """
+    def __init__(self, database = None, track_memory = False, interval = 1.0, stream = sys.stdout):
+        self.database = database
+        self.track_memory = track_memory
+        self.interval = interval
+        self.stream = stream
+        self.stages = []
+        self.counters = {}
+        self.started = time.time()
+        self.__active = []
+        # The peak memory of each active stage, before the peak was reset by its nested stages.
+        self.__peaks = {}
+        self.__last_progress = 0.0
+        self.__progress_shown = False
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Function that measures the stage executed in the with statement,
+        and prints its summary once it ends. Stages can be nested.
+        """
+        record = {'name': name, 'counters': {}}
+        queries = self.__query_count()
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # Keep the peak of the parent stages so far, before it is reset for this stage.
+            self.__fold_peak(tracemalloc.get_traced_memory()[1])
+            self.__peaks[id(record)] = 0
+            # The peak can only be reset by python 3.9 or later,
+            # otherwise it is the peak since the tracing started.
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+        self.__active.append(record)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_sec'] = time.perf_counter() - wall
+            record['cpu_sec'] = time.process_time() - cpu
+            self.__active.remove(record)
+            if queries is not None:
+                # The queries of the nested stages are included in the ones of their parents,
+                # so only the outermost stages add them to the run.
+                record['counters']['queries'] = self.__query_count() - queries
+                if not self.__active:
+                    self.counters['queries'] = self.counters.get('queries', 0) + record['counters']['queries']
+            if self.track_memory:
+                record['peak_memory_bytes'] = max(self.__peaks.pop(id(record), 0), tracemalloc.get_traced_memory()[1])
+                # The peak of a nested stage is also a peak of its parents.
+                self.__fold_peak(record['peak_memory_bytes'])
+            record['rates'] = {
+                counter: value / record['wall_sec']
+                for counter, value in record['counters'].items() if record['wall_sec'] > 0
+            }
+            self.stages.append(record)
+            self.__end_progress()
+            self.__print(self.summary(record))
+
+    def count(self, name, value = 1):
+        """
+        Function that increases a counter of the run and of its active stages.
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+        for record in self.__active:
+            record['counters'][name] = record['counters'].get(name, 0) + value
+
+    def progress(self, message):
+        """
+        Function that prints a progress message on a single line,
+        unless the previous one was printed less than an interval ago.
+        """
+        now = time.perf_counter()
+        if now - self.__last_progress < self.interval:
+            return
+        self.__last_progress = now
+        self.__progress_shown = True
+        self.stream.write(f'\r{message}')
+        self.stream.flush()
+
+    @staticmethod
+    def summary(record):
+        """
+        Function that returns a line that summarizes a stage.
+        """
+        line = f'{record["name"]}: {record["wall_sec"]:.2f} sec wall, {record["cpu_sec"]:.2f} sec cpu'
+        for counter, value in record['counters'].items():
+            rate = record['rates'].get(counter)
+            line += f', {value} {counter}' + (f' ({rate:.1f}/sec)' if rate is not None else '')
+        if 'peak_memory_bytes' in record:
+            line += f', peak memory {record["peak_memory_bytes"] / 2**20:.1f} MiB'
+        return line
+
+    def to_dict(self):
+        """
+        Function that returns the report of the run as a dict.
+        """
+        return {
+            'started': self.started,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'counters': self.counters,
+            'stages': self.stages
+        }
+
+    def save(self, filepath):
+        """
+        Function that writes the report of the run in a json file.
+        """
+        with open(filepath, 'w', encoding = 'utf-8') as f:
+            json.dump(self.to_dict(), f, indent = 2)
+
+    def __query_count(self):
+        # Return the number of queries executed by the database, if it is supplied.
+        return None if self.database is None else self.database.query_count
+
+    def __fold_peak(self, peak):
+        # Raise the peak memory of the active stages to the supplied peak.
+        for record in self.__active:
+            self.__peaks[id(record)] = max(self.__peaks.get(id(record), 0), peak)
+
+    def __end_progress(self):
+        # Move to the next line, if a progress message has been printed.
+        if self.__progress_shown:
+            self.stream.write('\n')
+            self.__progress_shown = False
+        self.__last_progress = 0.0
+
+    def __print(self, line):
+        self.stream.write(f'{line}\n')
+        self.stream.flush()
@@ -0,0 +1,74 @@
+"""
+This script contains the streaming reader of the json files of the issues,
+which has no dependencies, so that it is imported without the nlp libraries
+(e.g. by MLibrary), along with the rest of the utility functions.
+"""
+import json
+
+def read_issues(dirpath, chunk_size = 1 << 16):
+    """
+    Generator that yields the issues of a json file one at a time,
+    by incrementally decoding the elements of its top-level issues array.
+    Only the current chunk of the file is kept in memory, instead of the whole file.
+    A KeyError is raised if the top-level object has no issues key.
+    """
+    decoder = json.JSONDecoder()
+    with open(dirpath, encoding = 'utf-8-sig', errors = 'ignore') as f:
+        buffer, index, eof = '', 0, False
+
+        def skip(characters = ' \t\r\n'):
+            # Skip the specified characters, while reading more chunks if needed,
+            # and return the position of the next character in the buffer (or -1 at eof).
+            nonlocal buffer, index, eof
+            while True:
+                while index < len(buffer) and buffer[index] in characters:
+                    index += 1
+                if index < len(buffer) or eof:
+                    return index if index < len(buffer) else -1
+                buffer, index = f.read(chunk_size), 0
+                eof = buffer == ''
+
+        def decode():
+            # Decode the next json value, while reading more chunks until it is complete.
+            nonlocal buffer, index, eof
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, index)
+                    # A value that ends with the buffer (e.g. a number) may continue in the next chunk.
+                    if end < len(buffer) or eof:
+                        index = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                # Keep only the unread part of the buffer, and read the next chunk,
+                # which grows with the unread part to avoid decoding large values too many times.
+                chunk = f.read(max(chunk_size, len(buffer) - index))
+                eof = chunk == ''
+                buffer, index = buffer[index:] + chunk, 0
+
+        def expect(character):
+            if skip() == -1 or buffer[index] != character:
+                raise ValueError(f'Expected "{character}" at the top level of {dirpath}.')
+
+        # Find the issues key of the top-level object, and skip the values of the other keys.
+        expect('{')
+        index += 1
+        while True:
+            # The top-level object ended without an issues key, same as data['issues'].
+            if skip(' \t\r\n,') == -1 or buffer[index] == '}':
+                raise KeyError('issues')
+            key = decode()
+            expect(':')
+            index += 1
+            skip()
+            if key != 'issues':
+                decode()
+                continue
+
+            # Yield the elements of the issues array, one at a time.
+            expect('[')
+            index += 1
+            while skip(' \t\r\n,') != -1 and buffer[index] != ']':
+                yield decode()
+            return
@@ -0,0 +1,130 @@
+"""
+This script contains the lemmatization engine of generate_words,
+which tags many documents with one part-of-speech tagger,
+and memoizes the lemmas of the (token, tag) pairs.
+"""
+import os
+import time
+import pickle
+from pathlib import Path
+from collections import OrderedDict
+from nltk.corpus import wordnet
+from nltk.tag.perceptron import PerceptronTagger
+from nltk.stem.wordnet import WordNetLemmatizer
+
+def get_wordnet_tag(tag):
+    """
+    Function that maps default part-of-speech
+    tags to wordnet part-of-speech tags.
+    """
+    if tag.startswith('J'):
+        return wordnet.ADJ
+    elif tag.startswith('V'):
+        return wordnet.VERB
+    elif tag.startswith('N'):
+        return wordnet.NOUN
+    elif tag.startswith('R'):
+        return wordnet.ADV
+    else: #default lemmatizer parameter
+        return wordnet.NOUN
+
+class LemmatizationEngine:
+    """
+    Wrapper class which lemmatizes the tokens of many documents, with the same results
+    as pos_tag and WordNetLemmatizer.lemmatize, by loading the part-of-speech tagger once
+    (instead of on every pos_tag call), and by keeping the lemmas of the most recently used
+    (token, wordnet tag) pairs in a bounded memo, which can be saved to and loaded from a file.
+    """
+    def __init__(self, max_size = 1 << 20, filepath = None):
+        self.max_size = max_size
+        self.memo = OrderedDict()
+        self.lemmatizer = WordNetLemmatizer()
+        self.tagger = None
+        self.hits = 0
+        self.misses = 0
+        # The time spent in tagging, in lemmatizing (measured per batch), and in the lemmatizer (on misses).
+        self.tagging_time = 0.0
+        self.lemmatizing_time = 0.0
+        self.miss_time = 0.0
+        if filepath is not None and Path(filepath).is_file():
+            self.load(filepath)
+
+    def lemmatize(self, token, tag):
+        """
+        Function that returns the lemma of a token, given its wordnet tag.
+        """
+        key = (token, tag)
+        lemma = self.memo.get(key)
+        if lemma is not None:
+            self.memo.move_to_end(key)
+            self.hits += 1
+            return lemma
+
+        # Only the misses are timed, since the lemmatizer is much slower than the timer.
+        start = time.perf_counter()
+        lemma = self.memo[key] = self.lemmatizer.lemmatize(token, tag)
+        # Evict the least recently used pair, once the memo is full.
+        if len(self.memo) > self.max_size:
+            self.memo.popitem(last = False)
+        self.misses += 1
+        self.miss_time += time.perf_counter() - start
+        return lemma
+
+    def tag_documents(self, documents):
+        """
+        Function that returns the part-of-speech tags of the tokens of many documents,
+        same as calling pos_tag on each one of them.
+        """
+        start = time.perf_counter()
+        if self.tagger is None:
+            self.tagger = PerceptronTagger()
+        tags = [self.tagger.tag(tokens) for tokens in documents]
+        self.tagging_time += time.perf_counter() - start
+        return tags
+
+    def lemmatize_documents(self, documents):
+        """
+        Function that returns the lemmatized tokens of many documents.
+        """
+        tags = self.tag_documents(documents)
+        start = time.perf_counter()
+        lemmas = [
+            [self.lemmatize(token, get_wordnet_tag(tag)) for token, tag in tokens_tags]
+            for tokens_tags in tags
+        ]
+        self.lemmatizing_time += time.perf_counter() - start
+        return lemmas
+
+    def stats(self):
+        """
+        Function that returns the hit rate of the memo, and the estimated speedup of lemmatization,
+        i.e. the time that the lemmatizer would need for all pairs (based on its average time per miss),
+        divided by the time that was actually spent.
+        """
+        calls = self.hits + self.misses
+        spent = self.lemmatizing_time
+        return {
+            'size': len(self.memo),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / calls if calls else 0.0,
+            'tagging_sec': self.tagging_time,
+            'lemmatizing_sec': spent,
+            'speedup': calls * (self.miss_time / self.misses) / spent if self.misses and spent else 1.0
+        }
+
+    def save(self, filepath):
+        """
+        Function that saves the memo to a file, from the least to the most recently used pair.
+        """
+        # Write to a temporary file first, so that an interruption doesn't corrupt the memo.
+        with open(f'{filepath}.tmp', 'wb') as f:
+            pickle.dump(list(self.memo.items()), f)
+        os.replace(f'{filepath}.tmp', filepath)
+
+    def load(self, filepath):
+        """
+        Function that loads the memo from a file, keeping the most recently used pairs.
+        """
+        with open(filepath, 'rb') as f:
+            self.memo = OrderedDict(pickle.load(f)[-self.max_size:])
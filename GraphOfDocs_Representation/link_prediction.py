@@ -0,0 +1,315 @@
+"""
+This script contains the local link prediction engine,
+which exports the co-authorship graph once in a compressed sparse row structure,
+and computes the scores of the gds.alpha.linkprediction functions
+for millions of pairs of authors with vectorized sparse operations.
+"""
+import time
+import random
+import numpy as np
+from scipy.sparse import coo_matrix
+from concurrent.futures import ProcessPoolExecutor
+from GraphOfDocs_Representation.select import create_graph_features
+
+# The link prediction features, in the order of the columns of the datasets.
+features = ['adamic_adar', 'common_neighbors', 'preferential_attachment', 'total_neighbors']
+
+class CoauthorGraph:
+    """
+    Wrapper class which keeps the relationships of a type (e.g. co_author_early) between nodes,
+    by their neo4j ids, and its undirected adjacency, in compressed sparse row matrices,
+    where the nodes without relationships are mapped to an empty last row.
+    The degree of a node is the number of its relationships in both directions (a self-loop counts once)
+    and its neighbours are the distinct nodes on the other side of them, same as in the gds functions.
+    If the relationships have weights, the weight of the relationship between two nodes is kept too.
+    """
+    def __init__(self, node_ids, sources, targets, weights = None):
+        # The sorted neo4j ids of the nodes, and the relationships between their positions.
+        self.node_ids = np.asarray(node_ids, dtype = np.int64)
+        self.sources = np.asarray(sources, dtype = np.int64)
+        self.targets = np.asarray(targets, dtype = np.int64)
+        self.weights = None if weights is None else np.asarray(weights, dtype = np.float64)
+        count = len(self.node_ids) + 1
+
+        loops = self.sources == self.targets
+        self.degrees = (
+            np.bincount(self.sources, minlength = count) + np.bincount(self.targets, minlength = count)
+            - np.bincount(self.sources[loops], minlength = count)
+        ).astype(np.float64)
+        rows = np.concatenate((self.sources, self.targets))
+        columns = np.concatenate((self.targets, self.sources))
+        self.adjacency = coo_matrix(
+            (np.ones(len(rows), dtype = np.int32), (rows, columns)), shape = (count, count)
+        ).tocsr()
+        # Keep each neighbour once, regardless of the number of relationships with it.
+        self.adjacency.data[:] = 1
+        self.sizes = np.diff(self.adjacency.indptr)
+        # The weights of the common neighbours in the adamic adar score.
+        with np.errstate(divide = 'ignore'):
+            self.inverse_log_degrees = 1.0 / np.log(self.degrees)
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @classmethod
+    def from_database(cls, database, relationship, weight_property = None):
+        """
+        Function that exports the relationships of a type from the database, with a single streamed query.
+        """
+        query = f'MATCH (a)-[r:{relationship}]->(b) RETURN id(a), id(b)'
+        if weight_property is not None:
+            query += f', r.{weight_property}'
+        records = list(database.stream(query, 'r'))
+        ends = np.array([record[:2] for record in records], dtype = np.int64).reshape(-1, 2)
+        node_ids, positions = np.unique(ends, return_inverse = True)
+        positions = positions.reshape(-1, 2)
+        weights = None
+        if weight_property is not None:
+            weights = np.array([record[2] for record in records], dtype = np.float64)
+        return cls(node_ids, positions[:, 0], positions[:, 1], weights)
+
+    def save(self, filepath):
+        """
+        Function that saves the graph to a npz file.
+        """
+        arrays = {'node_ids': self.node_ids, 'sources': self.sources, 'targets': self.targets}
+        if self.weights is not None:
+            arrays['weights'] = self.weights
+        np.savez(filepath, **arrays)
+
+    @classmethod
+    def load(cls, filepath):
+        """
+        Function that loads a graph from a npz file.
+        """
+        with np.load(filepath) as arrays:
+            return cls(
+                arrays['node_ids'], arrays['sources'], arrays['targets'],
+                arrays['weights'] if 'weights' in arrays else None
+            )
+
+    def positions(self, node_ids):
+        """
+        Function that returns the positions of nodes, by their neo4j ids,
+        where the nodes without relationships are mapped to the empty last row.
+        """
+        node_ids = np.asarray(node_ids, dtype = np.int64)
+        positions = np.searchsorted(self.node_ids, node_ids)
+        found = positions < len(self.node_ids)
+        found[found] = self.node_ids[positions[found]] == node_ids[found]
+        positions[~found] = len(self.node_ids)
+        return positions
+
+    def link_prediction_features(self, nodes_1, nodes_2, chunk_size = 100000, workers = 1):
+        """
+        Function that returns the adamic adar, common neighbours, preferential attachment
+        and total neighbours scores of many pairs of nodes (by their neo4j ids) at once, as a dict of arrays.
+        The pairs are processed in chunks of chunk_size, by a pool of processes if workers > 1.
+        """
+        positions_1, positions_2 = self.positions(nodes_1), self.positions(nodes_2)
+        starts = range(0, len(positions_1), chunk_size)
+        chunks = [(positions_1[start:start + chunk_size], positions_2[start:start + chunk_size]) for start in starts]
+        if workers > 1 and len(chunks) > 1:
+            # The graph is sent to each worker once, when it starts.
+            with ProcessPoolExecutor(max_workers = workers, initializer = _set_graph, initargs = (self,)) as executor:
+                results = list(executor.map(_features_of_chunk, chunks))
+        else:
+            results = [_features(self, *chunk) for chunk in chunks]
+        return {
+            feature: np.concatenate([result[feature] for result in results]) if results else np.empty(0)
+            for feature in features
+        }
+
+    def edge_weights(self, nodes_1, nodes_2):
+        """
+        Function that returns the weight of the relationship between each pair of nodes,
+        or nan if they aren't connected, same as r.score of an optional match.
+        """
+        if self.weights is None:
+            raise ValueError('The relationships of the graph were exported without weights!')
+        positions_1, positions_2 = self.positions(nodes_1), self.positions(nodes_2)
+        # Add the reverse of each relationship, except for the self-loops.
+        reverse = self.sources != self.targets
+        weights = coo_matrix((
+            np.concatenate((self.weights, self.weights[reverse])),
+            (np.concatenate((self.sources, self.targets[reverse])), np.concatenate((self.targets, self.sources[reverse])))
+        ), shape = self.adjacency.shape).tocsr()
+        connected = np.asarray(self.adjacency[positions_1, positions_2]).ravel() > 0
+        result = np.full(len(positions_1), np.nan)
+        result[connected] = np.asarray(weights[positions_1, positions_2]).ravel()[connected]
+        return result
+
+def _features(graph, positions_1, positions_2):
+    # Compute the scores of a chunk of pairs of positions:
+    # the common neighbours are the products of the rows of the pairs,
+    # and the adamic adar score is the sum of their inverse log degrees.
+    common = graph.adjacency[positions_1].multiply(graph.adjacency[positions_2]).tocsr()
+    common_neighbors = np.asarray(common.sum(axis = 1), dtype = np.float64).ravel()
+    return {
+        'adamic_adar': common.dot(graph.inverse_log_degrees),
+        'common_neighbors': common_neighbors,
+        'preferential_attachment': graph.degrees[positions_1] * graph.degrees[positions_2],
+        'total_neighbors': graph.sizes[positions_1] + graph.sizes[positions_2] - common_neighbors
+    }
+
+# The graph of the worker processes, which is set once when they start.
+_graph = None
+
+def _set_graph(graph):
+    global _graph
+    _graph = graph
+
+def _features_of_chunk(chunk):
+    # Module-level function, so that it can be sent to the worker processes.
+    return _features(_graph, *chunk)
+
+class ExampleSampler:
+    """
+    Wrapper class which samples the positive examples (connected pairs) and the negative examples
+    (pairs whose shortest distance is from min_hops to max_hops) of a CoauthorGraph,
+    reproducibly by a seed. The negatives are sampled by choosing random source nodes,
+    expanding the frontiers of a batch of them at once by sparse products with the adjacency,
+    and choosing a random node among the ones in the distance range of each source,
+    so that the hubs don't bias the sample or expand a path per neighbour.
+    If an exclude graph is supplied (e.g. co_author_early for the test set of a time split),
+    the pairs that are connected in it aren't sampled.
+    """
+    def __init__(self, graph, seed = 0, exclude = None):
+        self.graph = graph
+        self.exclude = exclude
+        self.rng = np.random.RandomState(seed)
+
+    def positives(self, limit = None):
+        """
+        Function that returns up to limit random connected pairs, once each,
+        as a (pairs x 2) array of neo4j ids, in the direction of their relationship.
+        """
+        graph = self.graph
+        # Keep the first relationship of each unordered pair, without the self-loops.
+        keep = graph.sources != graph.targets
+        sources, targets = graph.sources[keep], graph.targets[keep]
+        keys = np.minimum(sources, targets) * (len(graph) + 1) + np.maximum(sources, targets)
+        _, first = np.unique(keys, return_index = True)
+        pairs = np.column_stack((graph.node_ids[sources[first]], graph.node_ids[targets[first]]))
+        pairs = pairs[~self.__excluded(pairs)]
+        count = len(pairs) if limit is None else min(limit, len(pairs))
+        return pairs[self.rng.choice(len(pairs), count, replace = False)]
+
+    def negatives(self, limit, min_hops = 2, max_hops = 3, batch_size = 10000, max_rounds = 1000, per_source = 1):
+        """
+        Function that returns up to limit random pairs, once each, whose shortest distance
+        is from min_hops to max_hops, as a (pairs x 2) array of neo4j ids.
+        The source nodes are sampled in batches of batch_size, for up to max_rounds batches,
+        and per_source random nodes are chosen from the range of each one, which amortizes
+        the expansion of its frontiers over more samples, at the cost of less independent pairs.
+        """
+        graph = self.graph
+        nodes = np.flatnonzero(graph.degrees[:-1] > 0)
+        seen, pairs = set(), []
+        for _ in range(max_rounds):
+            if len(pairs) >= limit or not len(nodes):
+                break
+            sources = nodes[self.rng.randint(len(nodes), size = batch_size)]
+            reachable = self.__reachable(sources, min_hops, max_hops)
+            counts = np.diff(reachable.indptr)
+            found = counts > 0
+            # Choose per_source random reachable nodes of each source.
+            rows = np.repeat(np.flatnonzero(found), per_source)
+            choices = reachable.indptr[rows] + (self.rng.random_sample(len(rows)) * counts[rows]).astype(np.int64)
+            batch = np.column_stack((graph.node_ids[sources[rows]], graph.node_ids[reachable.indices[choices]]))
+            batch = batch[~self.__excluded(batch)]
+            for node1, node2 in batch.tolist():
+                key = (min(node1, node2), max(node1, node2))
+                if key not in seen and len(pairs) < limit:
+                    seen.add(key)
+                    pairs.append((node1, node2))
+        return np.array(pairs, dtype = np.int64).reshape(-1, 2)
+
+    def examples(self, positives = None, negatives = None, min_hops = 2, max_hops = 3, **options):
+        """
+        Function that returns the positive and the negative examples as a (pairs x 3) array
+        of node1, node2, label rows. If the number of the negatives isn't supplied,
+        it is the same as the number of the positives (balanced mode).
+        """
+        positive = self.positives(positives)
+        negative = self.negatives(len(positive) if negatives is None else negatives, min_hops, max_hops, **options)
+        return np.vstack((
+            np.column_stack((positive, np.ones(len(positive), dtype = np.int64))),
+            np.column_stack((negative, np.zeros(len(negative), dtype = np.int64)))
+        ))
+
+    def __reachable(self, sources, min_hops, max_hops):
+        # Return a sparse matrix of the nodes whose shortest distance from each source is in the range,
+        # by expanding the frontier of all sources one hop at a time.
+        adjacency = self.graph.adjacency
+        frontier = coo_matrix(
+            (np.ones(len(sources), dtype = np.int32), (np.arange(len(sources)), sources)),
+            shape = (len(sources), adjacency.shape[1])
+        ).tocsr()
+        visited = frontier.copy()
+        reachable = coo_matrix(frontier.shape, dtype = np.int32).tocsr()
+        for hop in range(1, max_hops + 1):
+            frontier = frontier.dot(adjacency)
+            # Remove the visited nodes from the frontier, and count each new node once.
+            frontier = (frontier - frontier.multiply(visited)).tocsr()
+            frontier.eliminate_zeros()
+            frontier.data[:] = 1
+            visited = visited + frontier
+            if hop >= min_hops:
+                reachable = reachable + frontier
+        return reachable
+
+    def __excluded(self, pairs):
+        # Return whether each pair of neo4j ids is connected in the exclude graph.
+        if self.exclude is None or not len(pairs):
+            return np.zeros(len(pairs), dtype = bool)
+        positions_1, positions_2 = self.exclude.positions(pairs[:, 0]), self.exclude.positions(pairs[:, 1])
+        return np.asarray(self.exclude.adjacency[positions_1, positions_2]).ravel() > 0
+
+def write_examples(examples, filepath):
+    """
+    Function that writes the node1, node2, label rows of the examples to a csv file.
+    """
+    with open(filepath, 'w', newline = '', encoding = 'utf-8') as f:
+        f.write('node1,node2,label\n')
+        np.savetxt(f, np.asarray(examples, dtype = np.int64).reshape(-1, 3), fmt = '%d', delimiter = ',')
+
+def sample_time_split(early_graph, late_graph, train_size, test_size, min_hops = 2, max_hops = 3, seed = 0, **options):
+    """
+    Function that samples the balanced examples of a time split: the train examples of the early graph,
+    and the test examples of the late graph, whose pairs aren't connected in the early graph,
+    so that the test positives are new relationships. Returns the train and the test examples.
+    """
+    train = ExampleSampler(early_graph, seed).examples(train_size, None, min_hops, max_hops, **options)
+    test = ExampleSampler(late_graph, seed + 1, early_graph).examples(test_size, None, min_hops, max_hops, **options)
+    return train, test
+
+def compare_with_gds(database, graph, pairs, train_set = True, sample = 1000, seed = 0, tolerance = 1e-9):
+    """
+    Function that compares the scores of a sample of (node1, node2, label) pairs
+    with the ones of the gds functions (through create_graph_features),
+    and returns the pairs whose scores differ by more than the tolerance.
+    """
+    pairs = [[int(node1), int(node2), int(label)] for node1, node2, label in pairs]
+    random.Random(seed).shuffle(pairs)
+    expected = create_graph_features(database, pairs[:sample], train_set)
+    nodes_1, nodes_2 = [row[0] for row in expected], [row[1] for row in expected]
+    scores = graph.link_prediction_features(nodes_1, nodes_2)
+    mismatches = []
+    for index, row in enumerate(expected):
+        if any(abs(row[2 + column] - scores[feature][index]) > tolerance for column, feature in enumerate(features)):
+            mismatches.append((row[0], row[1]))
+    return mismatches
+
+def benchmark(graph, nodes_1, nodes_2, workers = (1, 2, 4)):
+    """
+    Function that measures the pairs per second of link_prediction_features
+    for each number of workers, and returns them as a dict.
+    """
+    rates = {}
+    for count in workers:
+        start = time.perf_counter()
+        graph.link_prediction_features(nodes_1, nodes_2, workers = count)
+        rates[count] = len(nodes_1) / (time.perf_counter() - start)
+        print(f'workers={count}: {rates[count]:.1f} pairs/sec')
+    return rates
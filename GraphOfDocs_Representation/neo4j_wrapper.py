@@ -1,36 +1,188 @@
+from contextlib import contextmanager
 from neo4j import GraphDatabase
 from neo4j.exceptions import ConstraintError, CypherError, ServiceUnavailable
+from GraphOfDocs_Representation.common import chunks
+
+def _values(result, mode):
+    # Return the records of a result, in the format of the execution mode.
+    if mode in ('r', 'w'):
+        return result.values()
+    elif mode == 'g':
+        return result.data()
+    raise TypeError('Execution mode can either be (r)ead, (w)rite or (g)raph data!')
+
+def _execute_many(executor, query, rows, batch_size):
+    # Execute a writing query for each batch of rows, as UNWIND $rows AS row followed by the query,
+    # by a session or a transaction, and return the number of batches.
+    count = 0
+    for batch in chunks(rows, batch_size):
+        executor.execute(f'UNWIND $rows AS row {query}', 'w', {'rows': batch})
+        count += 1
+    return count
 
 class Neo4jDatabase(object): 
     """
     Wrapper class which handles the database 
     more efficiently, by abstracting repeating code.
     """
-    def __init__(self, uri, user, password): # Create the database connection.
-        self._driver = GraphDatabase.driver(uri, auth=(user, password), encrypted = False)
+    def __init__(self, uri, user, password, max_connection_pool_size = 100,
+                 connection_acquisition_timeout = 60): # Create the database connection.
+        self._driver = GraphDatabase.driver(
+            uri, auth=(user, password), encrypted = False,
+            max_connection_pool_size = max_connection_pool_size,
+            connection_acquisition_timeout = connection_acquisition_timeout
+        )
+        # The number of queries executed, which is used by the instrumentation.
+        self.query_count = 0
 
     def close(self):
         self._driver.close()
 
-    def execute(self, query, mode): # Execute queries in the database.
+    def execute(self, query, mode, parameters = None): # Execute queries in the database.
+        self.query_count += 1
         with self._driver.session() as session:
             try:
                 if (mode == 'r'): # Reading query.
-                    result = session.read_transaction(self.__execute, query).values()
+                    result = session.read_transaction(self.__execute, query, parameters).values()
                 elif(mode == 'w'): # Writing query.
-                    result = session.write_transaction(self.__execute, query).values()
+                    result = session.write_transaction(self.__execute, query, parameters).values()
                 elif(mode == 'g'): # Returning graph data query.
-                    result = session.read_transaction(self.__execute, query).data()
+                    result = session.read_transaction(self.__execute, query, parameters).data()
                 else:
                     raise TypeError('Execution mode can either be (r)ead, (w)rite or (g)raph data!')
                 return result
             except (CypherError, ConstraintError) as err:
                 print(err) # Handle the erroneous query instead of breaking the execution.
 
+    @contextmanager
+    def session(self):
+        """
+        Function that opens a driver session, which is shared
+        by all statements executed in the with statement.
+        """
+        with self._driver.session() as session:
+            yield Neo4jSession(session, self)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Function that opens an explicit transaction, which is shared
+        by all statements executed in the with statement, and is committed
+        at its end, or rolled back if an error is raised.
+        """
+        with self.session() as session:
+            with session.transaction() as tx:
+                yield tx
+
+    def execute_many(self, query, rows, batch_size = 1000):
+        """
+        Function that executes a writing query for each row of an iterable,
+        as UNWIND $rows AS row followed by the query, in batches of batch_size rows,
+        where each batch is written in its own transaction of a shared session.
+        Unlike execute(), the errors are raised, so that a failed batch can be retried.
+        """
+        with self.session() as session:
+            return session.execute_many(query, rows, batch_size)
+
+    def stream(self, query, mode = 'r', parameters = None, fetch_size = 1000):
+        """
+        Generator that yields the records of a reading query one at a time, as lists (r)
+        or dicts (g), while they are received, instead of collecting them all in a list.
+        The fetch size is the number of records requested from the server at a time,
+        by the drivers that support it, while the older ones receive the records
+        of the connection buffer as they are consumed. The errors are raised.
+        """
+        if mode not in ('r', 'g'):
+            raise TypeError('Streaming mode can either be (r)ead or (g)raph data!')
+        self.query_count += 1
+        with self._driver.session(fetch_size = fetch_size) as session:
+            for record in session.run(query, parameters):
+                yield record.values() if mode == 'r' else record.data()
+
+    def paginate(self, query, key, parameters = None, page_size = 10000, after = -1, mode = 'r'):
+        """
+        Generator that yields the records of a reading query, page by page,
+        where each page is read in its own transaction, so that no long transaction
+        is kept open during very large scans. The query has to return the records
+        ordered by key (e.g. the id of the node), after the $after key and up to $limit records,
+        e.g. MATCH (w:Word) WHERE id(w) > $after RETURN id(w), w.key ORDER BY id(w) LIMIT $limit,
+        and key is a function that returns the key of a record.
+        """
+        parameters = dict(parameters or {})
+        while True:
+            parameters.update(after = after, limit = page_size)
+            with self.session() as session:
+                page = session.execute(query, mode, parameters)
+            yield from page
+            if len(page) < page_size:
+                return
+            after = key(page[-1])
+
     @staticmethod # static private method.
-    def __execute(tx, query):
+    def __execute(tx, query, parameters = None):
         try:
-            result = tx.run(query)
+            result = tx.run(query, parameters)
             return result
         except (CypherError, ConstraintError) as err:
             print(err) # Handle the erroneous query instead of breaking the execution.
+
+class Neo4jSession(object):
+    """
+    Wrapper class which executes many statements in one driver session,
+    each one in its own managed transaction, which is retried by the driver
+    on transient errors. Any other errors are raised to the caller.
+    """
+    def __init__(self, session, database):
+        self._session = session
+        self._database = database
+
+    def execute(self, query, mode, parameters = None):
+        self._database.query_count += 1
+        if mode == 'w':
+            return self._session.write_transaction(self.__execute, query, mode, parameters)
+        return self._session.read_transaction(self.__execute, query, mode, parameters)
+
+    def execute_many(self, query, rows, batch_size = 1000):
+        """
+        Function that executes a writing query for each row of an iterable, in batches,
+        as in Neo4jDatabase.execute_many, and returns the number of batches.
+        """
+        return _execute_many(self, query, rows, batch_size)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Function that begins an explicit transaction in this session,
+        which is committed at the end of the with statement, or rolled back on error.
+        """
+        tx = Neo4jTransaction(self._session.begin_transaction(), self._database)
+        try:
+            yield tx
+        except BaseException:
+            tx._tx.rollback()
+            raise
+        tx._tx.commit()
+
+    @staticmethod # static private method.
+    def __execute(tx, query, mode, parameters = None):
+        return _values(tx.run(query, parameters), mode)
+
+class Neo4jTransaction(object):
+    """
+    Wrapper class which executes many statements in one explicit transaction,
+    so that they are committed or rolled back together. The errors are raised to the caller.
+    """
+    def __init__(self, tx, database):
+        self._tx = tx
+        self._database = database
+
+    def execute(self, query, mode, parameters = None):
+        self._database.query_count += 1
+        return _values(self._tx.run(query, parameters), mode)
+
+    def execute_many(self, query, rows, batch_size = 1000):
+        """
+        Function that executes a writing query for each row of an iterable, in batches,
+        as in Neo4jDatabase.execute_many, all in this transaction.
+        """
+        return _execute_many(self, query, rows, batch_size)
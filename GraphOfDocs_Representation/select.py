@@ -41,6 +41,47 @@ def get_communities_tags(database, top_terms = None):
             top_tags[community] = [tag[0] for tag in tags_scores[:top_terms]]
     return top_tags
 
+def get_communities_ranked_tags(database):
+    """
+    This function streams the full ranking of the terms of every community,
+    in the order of get_communities_tags, as [community, words] records.
+    """
+    query = ('MATCH p=((p1:Paper)-[:includes]->(w:Word)) '
+             'WITH p1.community as community, w, count(p) as degree '
+             'WHERE degree > 1 '
+             'WITH community as com, w.key as word, w.pagerank as pagerank, degree as deg '
+             'ORDER BY com, deg DESC, pagerank DESC '
+             'RETURN com, collect(word)')
+    return database.stream(query, 'r')
+
+def get_communities_tags_version(database):
+    """
+    This function returns the number of papers, words and includes relationships,
+    which the ranking of the community terms depends on. It always returns one record,
+    even if the graph has no papers (e.g. a graph of issues).
+    """
+    query = ('OPTIONAL MATCH (p:Paper) '
+             'WITH count(p) AS papers '
+             'OPTIONAL MATCH (w:Word) '
+             'WITH papers, count(w) AS words '
+             'OPTIONAL MATCH (:Paper)-[r:includes]->(:Word) '
+             'RETURN papers, words, count(r)')
+    return database.execute(query, 'r')
+
+def get_papers_communities(database):
+    """
+    This function streams the community of every paper, as [id, community] records, in the order of their ids.
+    """
+    query = 'MATCH (p:Paper) RETURN id(p), p.community ORDER BY id(p)'
+    return database.stream(query, 'r')
+
+def get_words_pagerank(database):
+    """
+    This function streams the pagerank of every word, as [id, pagerank] records, in the order of their ids.
+    """
+    query = 'MATCH (w:Word) RETURN id(w), w.pagerank ORDER BY id(w)'
+    return database.stream(query, 'r')
+
 
 def get_positive_examples(database, limit, train_set = True):
     relationship = 'co_author_early' if train_set else 'co_author_late'
@@ -64,12 +105,17 @@ def get_negative_examples(database, limit, train_set = True, min_hops = 2, max_h
     return database.execute(query, 'r')
 
 def create_graph_features(database, data, train_set):
+    """
+    This function computes the link prediction features of [node1, node2, label] pairs.
+    The pairs are passed as a parameter, so that the query is planned once
+    and can be executed by a database, or by a session for each chunk of pairs.
+    """
     relationship = 'co_author_early' if train_set else 'co_author_late'
     similarity_edge = 'is_similar_early' if train_set else 'is_similar_late'
     #relationship = 'co_author'
 
     query = (
-    f'UNWIND {data} AS pair '
+    'UNWIND $data AS pair '
     'MATCH (p1) WHERE id(p1) = pair[0] '
     'MATCH (p2) WHERE id(p2) = pair[1] '
     f'OPTIONAL MATCH (p1)-[r:{similarity_edge}]-(p2) '
@@ -86,7 +132,7 @@ def create_graph_features(database, data, train_set):
     '       r.score AS similarity, '
     '       pair[2] AS label       '
     )
-    return database.execute(query, 'r')
+    return database.execute(query, 'r', {'data': data})
 
 def get_author_filenames(database, author_id):
     query = (
@@ -95,6 +141,43 @@ def get_author_filenames(database, author_id):
     )
     return database.execute(query, 'r')
 
+def get_authors_filenames_batch(database, author_ids, chunk_size = 1000, cache = None):
+    """
+    This function retrieves the filenames of the papers of many authors,
+    with one parameterized query per chunk of ids, and returns a dict
+    of author id to filenames, which are empty for the authors without papers.
+    If a cache dict is supplied, the authors found in it aren't queried,
+    and the results of the queries are added to it.
+    The queries are executed in a session, so that a failed chunk raises an error,
+    instead of recording its authors as authors without papers.
+    """
+    query = (
+    'UNWIND $ids AS author_id '
+    'MATCH (a:Author)-[:writes]->(p:Paper) '
+    'WHERE id(a) = author_id RETURN author_id, collect(p.filename)'
+    )
+    cache = {} if cache is None else cache
+    author_ids = [int(id) for id in author_ids]
+    missing = list(dict.fromkeys(id for id in author_ids if id not in cache))
+    with database.session() as session:
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            filenames = dict(session.execute(query, 'r', {'ids': chunk}))
+            # Only the authors of a successful query, which weren't returned, have no papers.
+            cache.update((id, filenames.get(id, [])) for id in chunk)
+    return {id: cache[id] for id in author_ids}
+
+def get_authors_filenames(database):
+    """
+    This function streams the filenames of the papers of every author,
+    as [author_id, filenames] records, with one query for all authors.
+    """
+    query = (
+    'MATCH (a:Author)-[:writes]->(p:Paper) '
+    'RETURN id(a), collect(p.filename)'
+    )
+    return database.stream(query, 'r')
+
 def get_filename_community(database, filename):
     query = (
     f"MATCH (p:Paper) WHERE p.filename='{filename}' RETURN p.community"
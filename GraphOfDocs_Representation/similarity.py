@@ -0,0 +1,86 @@
+"""
+This script contains functions that find
+the most similar words of all words at once,
+based on the cosine similarity of their vectors.
+"""
+import random
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from gensim import matutils
+
+def most_similar_all(vectors_norm, topn = 10, block_size = 128, workers = None):
+    """
+    Function that finds the topn most similar words of every word, excluding itself,
+    by multiplying blocks of the normalized float32 vectors with the whole matrix,
+    in parallel threads. The block size caps the memory of each thread to
+    block_size x words scores. Returns the indices and scores (words x topn arrays).
+    The indices are the same as the ones of most_similar, since the candidates of each block
+    are scored again in the same way as most_similar does, while the scores may differ
+    in the last float32 digit, due to the different order of the summation of the dot products.
+    """
+    vectors = np.asarray(vectors_norm, dtype = np.float32)
+    count, dim = vectors.shape
+    topn = min(topn, count - 1)
+    # Upper bound of the rounding difference between the scores of the matrix multiplication,
+    # and the scores of most_similar, which multiplies the matrix with each renormalized vector.
+    tolerance = 4 * dim * np.finfo(np.float32).eps
+    indices = np.empty((count, topn), dtype = np.int64)
+    scores = np.empty((count, topn), dtype = np.float32)
+
+    def process(start):
+        end = min(start + block_size, count)
+        block = np.dot(vectors[start:end], vectors.T)
+        # The (topn + 1)-th highest score of each word (since the word itself is included),
+        # minus the tolerance, is the threshold that no word of the exact top n can fall below.
+        kth = np.partition(block, count - topn - 1, axis = 1)[:, count - topn - 1]
+        rows, columns = np.nonzero(block >= (kth - tolerance)[:, None])
+        splits = np.searchsorted(rows, np.arange(1, end - start))
+        for word, candidates in zip(range(start, end), np.split(columns, splits)):
+            candidates = candidates[candidates != word]
+            # Score the candidates in the same way as most_similar does.
+            query = matutils.unitvec(np.array([vectors[word]]).mean(axis = 0)).astype(np.float32)
+            dists = np.dot(vectors[candidates], query)
+            # Sort the candidates by descending score, and ascending index on ties.
+            best = np.lexsort((candidates, -dists))[:topn]
+            indices[word] = candidates[best]
+            scores[word] = dists[best]
+
+    with ThreadPoolExecutor(max_workers = workers) as executor:
+        list(executor.map(process, range(0, count, block_size)))
+    return indices, scores
+
+def word2vec_most_similar_all(model, topn = 10, block_size = 128, workers = None):
+    """
+    Function that finds the topn most similar terms of every token of a word2vec model,
+    and returns a generator that yields each token along with its terms and their scores,
+    in the order of model.wv.vocab, like model.wv.most_similar(token, topn).
+    """
+    model.wv.init_sims()
+    indices, scores = most_similar_all(model.wv.vectors_norm, topn, block_size, workers)
+    index2word = model.wv.index2word
+    return (
+        (token, [
+            (index2word[term], float(score))
+            for term, score in zip(indices[vocab.index], scores[vocab.index])
+        ])
+        for token, vocab in model.wv.vocab.items()
+    )
+
+def compare_with_most_similar(model, similarities, sample = 1000, seed = 0, tolerance = 1e-6):
+    """
+    Function that compares a sample of the results of word2vec_most_similar_all
+    with the ones of most_similar, and returns the tokens whose terms differ,
+    or whose scores differ by more than the tolerance.
+    """
+    similarities = dict(similarities)
+    tokens = sorted(similarities)
+    random.Random(seed).shuffle(tokens)
+    mismatches = []
+    for token in tokens[:sample]:
+        expected = model.wv.most_similar(token, topn = len(similarities[token]))
+        if [term for term, _ in expected] != [term for term, _ in similarities[token]] or any(
+            abs(score - other) > tolerance
+            for (_, score), (_, other) in zip(expected, similarities[token])
+        ):
+            mismatches.append(token)
+    return mismatches
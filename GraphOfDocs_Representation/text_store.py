@@ -0,0 +1,127 @@
+"""
+This script contains the packed store of the texts of many documents,
+which keeps them one after the other in a single file with an offset index,
+so that they are read from a memory map, instead of parsing a file per document.
+"""
+import os
+import json
+import numpy as np
+from array import array
+from pathlib import Path
+from GraphOfDocs_Representation.common import memmap
+from GraphOfDocs_Representation.cooccurrence import Vocabulary
+
+def pack_texts(dirpath, items, tokenize = None):
+    """
+    Function that packs the (key, text) items in the files of a directory:
+    texts.bin holds the utf-8 encoded texts, offsets.npy the byte offset of each text
+    (followed by the end of the last one) and keys.json the key of each text.
+    If a tokenize function is supplied, the token ids of each text are packed too,
+    in tokens.bin, token_offsets.npy and words.json.
+    """
+    dirpath = Path(dirpath)
+    dirpath.mkdir(parents = True, exist_ok = True)
+    keys, offsets = [], array('q', [0])
+    vocabulary, token_offsets = Vocabulary(), array('q', [0])
+    # Remove keys.json of a previous packing first, write to temporary files, and keys.json last,
+    # so that an interrupted packing doesn't leave a store whose keys point into the new texts.
+    if (dirpath / 'keys.json').is_file():
+        os.remove(dirpath / 'keys.json')
+    with open(dirpath / 'texts.bin.tmp', 'wb') as texts_file, \
+         open(dirpath / 'tokens.bin.tmp', 'wb') as tokens_file:
+        for key, text in items:
+            data = text.encode('utf-8', 'surrogatepass')
+            texts_file.write(data)
+            keys.append(key)
+            offsets.append(offsets[-1] + len(data))
+            if tokenize is not None:
+                tokens = array('I', [vocabulary.add(token) for token in tokenize(text)])
+                tokens.tofile(tokens_file)
+                token_offsets.append(token_offsets[-1] + len(tokens))
+
+    os.replace(dirpath / 'texts.bin.tmp', dirpath / 'texts.bin')
+    np.save(dirpath / 'offsets.npy', np.frombuffer(offsets, dtype = np.int64))
+    if tokenize is not None:
+        os.replace(dirpath / 'tokens.bin.tmp', dirpath / 'tokens.bin')
+        np.save(dirpath / 'token_offsets.npy', np.frombuffer(token_offsets, dtype = np.int64))
+        with open(dirpath / 'words.json', 'w', encoding = 'utf-8') as f:
+            json.dump(vocabulary.words, f)
+    else:
+        # Remove the tokens of a previous packing, so that they aren't read along with the new texts.
+        os.remove(dirpath / 'tokens.bin.tmp')
+        for name in ['tokens.bin', 'token_offsets.npy', 'words.json']:
+            if (dirpath / name).is_file():
+                os.remove(dirpath / name)
+    with open(dirpath / 'keys.json.tmp', 'w', encoding = 'utf-8') as f:
+        json.dump(keys, f)
+    os.replace(dirpath / 'keys.json.tmp', dirpath / 'keys.json')
+
+class TextStore:
+    """
+    Wrapper class which reads the texts packed by pack_texts, and their token ids if they were packed,
+    from memory maps of the files, so that any text is accessed by its key without parsing.
+    The token ids are returned as read-only views of the memory map, without copying them.
+    """
+    def __init__(self, dirpath):
+        self.dirpath = Path(dirpath)
+        with open(self.dirpath / 'keys.json', encoding = 'utf-8') as f:
+            self.keys = json.load(f)
+        self.positions = {key: position for position, key in enumerate(self.keys)}
+        self.offsets = np.load(self.dirpath / 'offsets.npy')
+        self.data = memmap(self.dirpath / 'texts.bin', np.uint8)
+        self.words = None
+        if (self.dirpath / 'words.json').is_file():
+            with open(self.dirpath / 'words.json', encoding = 'utf-8') as f:
+                self.words = json.load(f)
+            self.token_offsets = np.load(self.dirpath / 'token_offsets.npy')
+            self.tokens = memmap(self.dirpath / 'tokens.bin', np.uint32)
+
+    @staticmethod
+    def exists(dirpath):
+        """
+        Function that checks whether a directory holds a completely packed store.
+        """
+        return (Path(dirpath) / 'keys.json').is_file()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def text(self, key):
+        """
+        Function that returns the text of a key.
+        """
+        return self.__text(self.positions[key])
+
+    def texts(self, keys):
+        """
+        Function that returns the texts of many keys, in the order of the keys,
+        while reading them in the order of their offsets in the file.
+        """
+        positions = [self.positions[key] for key in keys]
+        texts = [None] * len(positions)
+        for index in sorted(range(len(positions)), key = positions.__getitem__):
+            texts[index] = self.__text(positions[index])
+        return texts
+
+    def token_ids(self, key):
+        """
+        Function that returns the token ids of the text of a key, as ids of words.
+        """
+        if self.words is None:
+            raise ValueError('The texts of the store were packed without tokens!')
+        position = self.positions[key]
+        return self.tokens[self.token_offsets[position]:self.token_offsets[position + 1]]
+
+    def token_ids_batch(self, keys):
+        """
+        Function that returns the token ids of the texts of many keys, in the order of the keys.
+        """
+        return [self.token_ids(key) for key in keys]
+
+    def __text(self, position):
+        # Decode the bytes of the text of a position.
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self.data[start:end].tobytes().decode('utf-8', 'surrogatepass')
@@ -0,0 +1,168 @@
+"""
+This script contains the on-disk cache of the tokens
+generated by generate_words, which is shared by
+all stages of the pipeline and all of its runs.
+"""
+import json
+import hashlib
+import numpy as np
+from array import array
+from pathlib import Path
+from GraphOfDocs_Representation.cooccurrence import Vocabulary
+from GraphOfDocs_Representation.utils import generate_words_batch, stop_words
+
+# The version of the files of the cache, which invalidates them when it changes.
+CACHE_VERSION = 1
+
+# The record of each text in the index file: the hash of the text,
+# and the offset and length of its tokens in the token file.
+index_dtype = np.dtype([('hash', 'V16'), ('offset', '<u8'), ('length', '<u4')])
+
+def text_hash(text):
+    """
+    Function that returns the 16 byte hash of a text.
+    """
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size = 16).digest()
+
+class TokenCache:
+    """
+    Wrapper class which caches the tokens that generate_words returns for each text,
+    as a compact corpus of token ids, keyed by the hash of the text.
+    The tokens of each combination of options (extend_window, insert_stopwords, lemmatize, stem)
+    and stopwords are kept in a separate directory, so that changing them invalidates the cache.
+    The new tokens are appended to the files once flush_size texts are added, or on close.
+    """
+    def __init__(self, dirpath, flush_size = 10000, **options):
+        self.options = options
+        self.flush_size = flush_size
+        # The directory of the options, named after their hash.
+        key = json.dumps({
+            'version': CACHE_VERSION,
+            'options': sorted(options.items()),
+            'stop_words': sorted(stop_words)
+        })
+        self.dirpath = Path(dirpath) / hashlib.sha1(key.encode('utf-8')).hexdigest()
+        self.dirpath.mkdir(parents = True, exist_ok = True)
+        with open(self.dirpath / 'options.json', 'w', encoding = 'utf-8') as f:
+            json.dump(options, f)
+
+        self.vocabulary = Vocabulary()
+        self.tokens = array('I')
+        self.index = {}
+        self.load()
+        # The parts of the vocabulary, tokens and index that haven't been written yet.
+        self.vocabulary.pop_new()
+        self.written = len(self.tokens)
+        self.pending = []
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def load(self):
+        """
+        Function that loads the cached tokens from the files of the directory.
+        """
+        if not (self.dirpath / 'index.bin').is_file():
+            return
+        # The files are written in the order words, tokens, index, so an interrupted flush
+        # can only leave words and tokens that aren't referenced by the index,
+        # which are removed from the files, so that the next flush appends after the valid ones.
+        # A partial record at the end of the index is removed too, so that the next records stay aligned.
+        with open(self.dirpath / 'index.bin', 'rb+') as f:
+            data = f.read()
+            size = len(data) - len(data) % index_dtype.itemsize
+            f.truncate(size)
+        records = np.frombuffer(data[:size], dtype = index_dtype)
+        self.index = {
+            bytes(record['hash']): (int(record['offset']), int(record['length']))
+            for record in records
+        }
+        with open(self.dirpath / 'words.txt', 'rb+') as f:
+            data = f.read()
+            f.truncate(data.rfind(b'\n') + 1)
+        for word in data[:data.rfind(b'\n') + 1].decode('utf-8').split('\n')[:-1]:
+            self.vocabulary.add(word)
+        end = int((records['offset'] + records['length']).max()) if len(records) else 0
+        with open(self.dirpath / 'tokens.bin', 'rb+') as f:
+            self.tokens.frombytes(f.read(end * self.tokens.itemsize))
+            f.truncate(end * self.tokens.itemsize)
+
+    def get(self, text):
+        """
+        Function that returns the cached tokens of a text, or None if they aren't cached.
+        """
+        entry = self.index.get(text_hash(text))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        offset, length = entry
+        words = self.vocabulary.words
+        return [words[id] for id in self.tokens[offset:offset + length]]
+
+    def put(self, text, tokens):
+        """
+        Function that adds the tokens of a text to the cache.
+        """
+        key = text_hash(text)
+        if key in self.index:
+            return
+        offset = len(self.tokens)
+        self.tokens.extend(self.vocabulary.add(token) for token in tokens)
+        self.index[key] = (offset, len(tokens))
+        self.pending.append(key)
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+
+    def generate_words(self, text):
+        """
+        Function that returns the tokens of a text from the cache,
+        or generates them by using generate_words_batch and adds them to the cache.
+        """
+        return self.generate_words_batch([text])[0]
+
+    def generate_words_batch(self, texts):
+        """
+        Function that returns the tokens of many texts, where the ones that aren't cached
+        are generated at once by using generate_words_batch and are added to the cache.
+        """
+        words = [self.get(text) for text in texts]
+        missing = [text for text, tokens in zip(texts, words) if tokens is None]
+        generated = iter(generate_words_batch(missing, **self.options) if missing else [])
+        for index, text in enumerate(texts):
+            if words[index] is None:
+                words[index] = next(generated)
+                self.put(text, words[index])
+        return words
+
+    def flush(self):
+        """
+        Function that appends the new words, tokens and index records to the files.
+        """
+        if not self.pending:
+            return
+        # The words are written as bytes, so that the line endings are \n on every platform.
+        with open(self.dirpath / 'words.txt', 'ab') as f:
+            f.writelines(f'{word}\n'.encode('utf-8') for word in self.vocabulary.pop_new())
+        with open(self.dirpath / 'tokens.bin', 'ab') as f:
+            self.tokens[self.written:].tofile(f)
+        self.written = len(self.tokens)
+        records = np.array(
+            [(key, *self.index[key]) for key in self.pending], dtype = index_dtype
+        )
+        with open(self.dirpath / 'index.bin', 'ab') as f:
+            records.tofile(f)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+
+    # These methods enable the use of this class in a with statement.
+    def __enter__(self):
+        return self
+
+    # Automatic flush of the new tokens of this class.
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
@@ -0,0 +1,97 @@
+"""
+This script contains the normalization and the fast tokenization of the texts
+of generate_words and generate_words_batch, which depend only on the tokenizer of nltk,
+so that they are imported (and tested) without its corpora.
+"""
+import re
+from string import punctuation
+from nltk.tokenize import word_tokenize, TreebankWordTokenizer
+
+try:
+    # The tokenizer that word_tokenize applies to each sentence, which changes between the versions of nltk.
+    from nltk.tokenize import _treebank_word_tokenizer as word_tokenizer
+except ImportError:
+    word_tokenizer = TreebankWordTokenizer()
+
+# Translation tables of generate_words, which are built once instead of on every call.
+# Remove the special characters that connect words.
+quotes_table = str.maketrans({ord(c): '' for c in '\'\"'})
+# Translate punctuation to space.
+punctuation_table = str.maketrans({ord(c): ' ' for c in punctuation})
+
+# The unicode quotes, which word_tokenize separates from the words, and the unicode dashes
+# (figure dash to horizontal bar), which are separated only by the newer versions of nltk.
+separated_characters = '«“‘„»”’'
+if word_tokenizer.tokenize('a–b') == ['a', '–', 'b']:
+    separated_characters += ''.join(chr(c) for c in range(0x2012, 0x2016))
+# Surround the separated characters with spaces.
+separated_table = str.maketrans({ord(c): f' {c} ' for c in separated_characters})
+
+# The contractions that word_tokenize splits in two tokens, which are the only ones
+# that contain no punctuation, along with a substring that has to exist for them to match.
+contractions = [
+    (substring, re.compile(pattern)) for substring, pattern in [
+        ('cannot', r'(?i)\b(can)(not)\b'), ('gimme', r'(?i)\b(gim)(me)\b'),
+        ('gonna', r'(?i)\b(gon)(na)\b'), ('gotta', r'(?i)\b(got)(ta)\b'),
+        ('lemme', r'(?i)\b(lem)(me)\b'), ('wanna', r'(?i)\b(wan)(na)\s')
+    ]
+]
+
+def preprocess_text(text, extend_window = False):
+    """
+    Function that normalizes a text before its tokenization, which is shared
+    by generate_words and generate_words_batch: the whitespace is collapsed, the quotes
+    are removed, the ends of sentences are marked and the punctuation is translated to space.
+    Returns the lowercase text.
+    """
+    # Remove all whitespace characters (by split) and join on space.
+    text = ' '.join(text.split())
+    # Handle special characters that connect words.
+    text = text.translate(quotes_table)
+    # Find all end of sentences and introduce a special string to track them.
+    # If they aren't tracked, then the window is allowed to be extended from one sentence to another,
+    # thus connecting the last terms of one sentence with the starting ones of the next.
+    # Also, by chaining the replace methods together, a slight amount of performance is achieved,
+    # over other methods, that have the same output.
+    if not extend_window:
+        text = text.replace('. ', ' e5c ')\
+                    .replace('! ', ' e5c ' )\
+                    .replace('? ', ' e5c ' )
+    # Translate punctuation to space and lowercase the string.
+    return text.translate(punctuation_table).lower()
+
+def split_words(text):
+    """
+    Function that splits a lowercase text, whose punctuation has been translated to spaces,
+    by applying only the rules of the tokenizer of word_tokenize that can match such a text
+    (unicode quotes, unicode dashes and contractions), without sentence splitting.
+    """
+    # Extra spaces at both ends, same as the treebank tokenizer.
+    text = f' {text.translate(separated_table)} '
+    for substring, contraction in contractions:
+        # Skip the regular expressions that can't match the (lowercase) text.
+        if substring in text:
+            text = contraction.sub(r' \1 \2 ', text)
+    return text.split()
+
+# Texts that exercise every rule of split_words, and the characters that the rules don't handle.
+probe_texts = [
+    'the option « fs » is “ deprecated ” in ‘ core ’ „ since ” 2 0 – use » instead',
+    'a–b foo—bar α–β x‒y z―w a - b a -- b',
+    'cannot gonna wanna go gimme lemme gotta wanna',
+    'übergröße café naïve 日本語 emoji 🙂 … · ¿ ¡ § ° € £ ™ © ®',
+    'e5c cannotx xgonna wannabe lemmeknow'
+]
+
+# Whether split_words matches the installed tokenizer, otherwise word_tokenize is used,
+# e.g. if a later version of nltk adds a rule that split_words doesn't apply.
+fast_tokenizer_matches = all(split_words(text) == word_tokenizer.tokenize(text) for text in probe_texts)
+
+def fast_word_tokenize(text):
+    """
+    Function that splits a lowercase text, whose punctuation has been translated to spaces,
+    into the same tokens as word_tokenize, by using split_words if it matches the installed tokenizer.
+    """
+    if fast_tokenizer_matches:
+        return split_words(text)
+    return word_tokenize(text)
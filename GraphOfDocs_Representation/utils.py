@@ -2,21 +2,30 @@
 This script contains utility functions
 e.g to read files, preprocess text, etc.
 """
+import time
 from os import system
+from queue import Queue, Full
+from threading import Event, Thread
+from concurrent.futures import ProcessPoolExecutor
 from os import listdir
 from os.path import isfile, join
-from string import punctuation, printable
-from nltk import pos_tag, sent_tokenize
-from nltk.corpus import wordnet, stopwords
-from nltk.stem.wordnet import WordNetLemmatizer
+from string import printable
+from nltk.corpus import stopwords
 from nltk.stem import PorterStemmer
 from nltk.tokenize import word_tokenize
+from GraphOfDocs_Representation.common import chunks
+from GraphOfDocs_Representation.json_stream import read_issues
+from GraphOfDocs_Representation.tokenization import fast_word_tokenize, preprocess_text
+from GraphOfDocs_Representation.lemmatization import LemmatizationEngine, get_wordnet_tag
 from GraphOfDocs_Representation.neo4j_wrapper import Neo4jDatabase
 from neo4j import ServiceUnavailable
 import sys
+import numpy as np
+from scipy.sparse import csr_matrix
 
 
-lemmatizer = WordNetLemmatizer() # Initialize lemmatizer once.
+# Initialize the lemmatizer once, along with the part-of-speech tagger and the memo of lemmas.
+lemmatization_engine = LemmatizationEngine()
 stemmer = PorterStemmer() # Initialize Porter's stemmer once.
 
 stop_words = set(stopwords.words('english')).union([ # Augment the stopwords set.
@@ -31,57 +40,144 @@ stop_words = set(stopwords.words('english')).union([ # Augment the stopwords set
     'isnt', 'youre', 'wont', 'from', 'subject', 'hes', 'etc',
     'edu', 'com', 'org', 've', 'll', 'd', 're', 't', 's'])
 
-def get_wordnet_tag(tag):
+def filter_tokens(tokens, insert_stopwords = False):
     """
-    Function that maps default part-of-speech 
-    tags to wordnet part-of-speech tags.
+    Function that removes the stopwords, numbers and leftover syllabes/letters
+    from the tokens of a text, unless the stopwords are inserted.
     """
-    if tag.startswith('J'):
-        return wordnet.ADJ
-    elif tag.startswith('V'):
-        return wordnet.VERB
-    elif tag.startswith('N'):
-        return wordnet.NOUN
-    elif tag.startswith('R'):
-        return wordnet.ADV
-    else: #default lemmatizer parameter
-        return wordnet.NOUN
+    if insert_stopwords:
+        return tokens
+    return [token for token in tokens
+            if not token in stop_words and not token.isnumeric() and len(token) > 2]
 
 def generate_words(text, extend_window = False, insert_stopwords = False, lemmatize = False, stem = False):
     """
     Function that generates words from a text corpus and optionally lemmatizes them.
     Returns a set of unique tokens based on order of appearance in-text.
     """
-    # Remove all whitespace characters (by split) and join on space.
-    text = ' '.join(text.split())
-    # Handle special characters that connect words.
-    text = text.translate({ord(c): '' for c in '\'\"'})
-    # Find all end of sentences and introduce a special string to track them.
-    # If they aren't tracked, then the window is allowed to be extended from one sentence to another,
-    # thus connecting the last terms of one sentence with the starting ones of the next.
-    # Also, by chaining the replace methods together, a slight amount of performance is achieved,
-    # over other methods, that have the same output.
-    if not extend_window:
-        text = text.replace('. ', ' e5c ')\
-                    .replace('! ', ' e5c ' )\
-                    .replace('? ', ' e5c ' )
-    # Translate punctuation to space and lowercase the string.
-    text = text.translate({ord(c): ' ' for c in punctuation}).lower()
     # We are cleaning the data from stopwords, numbers and leftover syllabes/letters.
-    if not insert_stopwords:
-        tokens = [token for token in word_tokenize(text)
-        if not token in stop_words and not token.isnumeric() and len(token) > 2]
-    else:
-        tokens = word_tokenize(text)
+    tokens = filter_tokens(word_tokenize(preprocess_text(text, extend_window)), insert_stopwords)
     if lemmatize:
-        tokens_tags = pos_tag(tokens) # Create part-of-speech tags.
-        # Overwrite the list with the lemmatized versions of tokens.
-        tokens = [lemmatizer.lemmatize(token, get_wordnet_tag(tag)) for token, tag in tokens_tags]
+        # Overwrite the list with the lemmatized versions of tokens, based on their part-of-speech tags.
+        tokens = lemmatization_engine.lemmatize_documents([tokens])[0]
     if stem:
         # Overwrite the list with the stemmed versions of tokens.
         tokens = [stemmer.stem(token) for token in tokens]
     return tokens
 
+def generate_words_batch(texts, extend_window = False, insert_stopwords = False, lemmatize = False, stem = False):
+    """
+    Function that generates the words of many texts, and returns a list
+    with the same tokens as generate_words would return for each text,
+    by using fast_word_tokenize instead of word_tokenize, and by tagging
+    and lemmatizing the tokens of all texts at once, if lemmatize is enabled.
+    """
+    words = [
+        filter_tokens(fast_word_tokenize(preprocess_text(text, extend_window)), insert_stopwords)
+        for text in texts
+    ]
+    if lemmatize:
+        # Tag and lemmatize the tokens of all texts at once.
+        words = lemmatization_engine.lemmatize_documents(words)
+    if stem:
+        words = [[stemmer.stem(token) for token in tokens] for tokens in words]
+    return words
+
+def compare_generate_words(texts, **options):
+    """
+    Function that compares the words of generate_words_batch with the ones of generate_words,
+    e.g. on the texts of the jira issues, and returns the indices of the texts which differ.
+    """
+    return [
+        i for i, (text, words) in enumerate(zip(texts, generate_words_batch(texts, **options)))
+        if generate_words(text, **options) != words
+    ]
+
+def benchmark_generate_words(texts, **options):
+    """
+    Function that measures the documents per second of generate_words
+    and generate_words_batch on the supplied texts, and returns them.
+    """
+    start = time.perf_counter()
+    for text in texts:
+        generate_words(text, **options)
+    end = time.perf_counter()
+    single = len(texts) / (end - start)
+
+    start = time.perf_counter()
+    generate_words_batch(texts, **options)
+    end = time.perf_counter()
+    batch = len(texts) / (end - start)
+
+    print(f'generate_words: {single:.1f} docs/sec, generate_words_batch: {batch:.1f} docs/sec')
+    return single, batch
+
+def _generate_words_of_chunk(texts, options):
+    # Module-level function, so that it can be sent to the worker processes.
+    return generate_words_batch(texts, **options)
+
+def generate_words_parallel(items, text, workers = None, chunk_size = 100, queue_size = 8, cache = None, **options):
+    """
+    Generator that yields each item along with the words of its text (as in generate_words),
+    in the original order, while the texts are tokenized by a pool of processes in chunks.
+    The chunks are submitted by a separate thread into a bounded queue, which applies backpressure,
+    so that at most queue_size chunks are tokenized ahead of the consumer (e.g. the database writer).
+    If a TokenCache is supplied, its options are used, only the texts that aren't cached
+    are sent to the pool, and their words are added to the cache.
+    """
+    pending = Queue(maxsize = queue_size)
+    stop = Event()
+    if cache is not None:
+        options = cache.options
+
+    def put(entry):
+        # Wait for a free slot in the queue, unless the consumer has stopped.
+        while not stop.is_set():
+            try:
+                pending.put(entry, timeout = 0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce(executor):
+        try:
+            for chunk in chunks(items, chunk_size):
+                texts = [text(item) for item in chunk]
+                # The words of the cached texts, None for the ones that have to be tokenized.
+                cached = [None] * len(texts) if cache is None else [cache.get(t) for t in texts]
+                missing = [t for t, words in zip(texts, cached) if words is None]
+                future = executor.submit(_generate_words_of_chunk, missing, options) if missing else None
+                if not put((chunk, (texts, cached, future))):
+                    return
+        except BaseException as error:
+            # Hand over the error to the consumer, to be raised there.
+            put((None, error))
+        put(None)
+
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        producer = Thread(target = produce, args = (executor,), daemon = True)
+        producer.start()
+        try:
+            while True:
+                entry = pending.get()
+                if entry is None:
+                    break
+                chunk, result = entry
+                if chunk is None:
+                    raise result
+                texts, cached, future = result
+                generated = iter([] if future is None else future.result())
+                for item, t, words in zip(chunk, texts, cached):
+                    if words is None:
+                        words = next(generated)
+                        if cache is not None:
+                            cache.put(t, words)
+                    yield item, words
+        finally:
+            stop.set()
+            producer.join()
+
 def clear_screen(current_system):
     if current_system == 'Windows':
         system('cls')
@@ -102,6 +198,60 @@ def jaccard_similarity(list_1, list_2):
     set2 = set(list_2)
     return len(set1.intersection(set2)) / len(set1.union(set2))
 
+def jaccard_similarity_batch(matrix, rows_1, rows_2, chunk_size = 100000):
+    """
+    Function to calculate the jaccard similarity between many pairs
+    of rows of a binary sparse (entity x term) matrix at once,
+    same as jaccard_similarity on the terms of each pair of rows.
+    The intersections are the sums of the products of the rows,
+    and the unions are the sums of the rows minus the intersections.
+    The pairs are processed in chunks of chunk_size, to bound the memory.
+    """
+    # Copy the matrix, so that removing its duplicates and zeros doesn't modify the supplied one,
+    # and set the values of its non-zero entries to 1.
+    matrix = csr_matrix(matrix, copy = True)
+    matrix.sum_duplicates()
+    matrix.eliminate_zeros()
+    matrix = csr_matrix(
+        (np.ones(matrix.nnz, dtype = np.int32), matrix.indices, matrix.indptr), shape = matrix.shape
+    )
+    sizes = np.diff(matrix.indptr)
+    rows_1 = np.asarray(rows_1, dtype = np.int64)
+    rows_2 = np.asarray(rows_2, dtype = np.int64)
+
+    similarities = np.zeros(len(rows_1))
+    for start in range(0, len(rows_1), chunk_size):
+        chunk_1 = rows_1[start:start + chunk_size]
+        chunk_2 = rows_2[start:start + chunk_size]
+        intersections = np.asarray(matrix[chunk_1].multiply(matrix[chunk_2]).sum(axis = 1)).ravel()
+        unions = sizes[chunk_1] + sizes[chunk_2] - intersections
+        # The similarity is 0.0 if either of the rows is empty.
+        nonempty = (sizes[chunk_1] > 0) & (sizes[chunk_2] > 0)
+        similarities[start:start + chunk_size][nonempty] = intersections[nonempty] / unions[nonempty]
+    return similarities
+
+def benchmark_jaccard_similarity(matrix, rows_1, rows_2, **options):
+    """
+    Function that measures the pairs per second of jaccard_similarity
+    (on the terms of each row of the matrix) and jaccard_similarity_batch
+    on the supplied pairs of rows, and returns them.
+    """
+    matrix = csr_matrix(matrix)
+    terms = [matrix.indices[start:end].tolist() for start, end in zip(matrix.indptr, matrix.indptr[1:])]
+    start = time.perf_counter()
+    for row_1, row_2 in zip(rows_1, rows_2):
+        jaccard_similarity(terms[row_1], terms[row_2])
+    end = time.perf_counter()
+    single = len(rows_1) / (end - start)
+
+    start = time.perf_counter()
+    jaccard_similarity_batch(matrix, rows_1, rows_2, **options)
+    end = time.perf_counter()
+    batch = len(rows_1) / (end - start)
+
+    print(f'jaccard_similarity: {single:.1f} pairs/sec, jaccard_similarity_batch: {batch:.1f} pairs/sec')
+    return single, batch
+
 def connect_to_the_database():
     try:
         database = Neo4jDatabase('bolt://localhost:7687', 'neo4j', '123')
@@ -2,6 +2,8 @@ import csv
 import pandas
 import json
 
+from GraphOfDocs_Representation.json_stream import read_issues
+
 
 def convert_json_dataset_to_csv(input_filename: str, output_filename: str, unassigned_issues: bool = True):
     """"Convert a JSON file with Jira issues into a CSV file.
@@ -9,8 +11,8 @@ def convert_json_dataset_to_csv(input_filename: str, output_filename: str, unass
     :param output_filename: the path of the CSV output file
     :param unassigned_issues: if true then the issues without an assignee are also kept
     """
-    with open(input_filename) as f:
-        issues = json.load(f)['issues']
+    # Read the issues one at a time, instead of loading the whole file in memory.
+    issues = read_issues(input_filename)
     with open(output_filename, 'w',
         encoding = 'utf-8-sig', errors = 'ignore') as f:
         fieldnames = ['label', 'text']
@@ -1,12 +1,21 @@
 import argparse
 import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
 
+import numpy as np
 import pandas as pd
+from scipy.sparse import csr_matrix
 from sklearn.feature_extraction.text import TfidfVectorizer
 from tqdm import tqdm
 
 from GraphOfDocs_Representation import select
 from GraphOfDocs_Representation import utils
+from GraphOfDocs_Representation.community_tags import CommunityTagRanking
+from GraphOfDocs_Representation.cooccurrence import Vocabulary
+from GraphOfDocs_Representation.text_store import TextStore, pack_texts
 
 tags_per_community = {}
 filenames_community = {}
@@ -27,53 +36,214 @@ def _get_text_from_paper_file(input_dir, sha):
     return text
 
 
-def _get_important_terms_of_author(database, vocabulary: set, author_id, input_dir):
-    """Create a list of the most representative terms for a given author.
+def _tokenize(text):
+    return text.lower().split()
 
-    :param database: the database connector
-    :param vocabulary: the vocabulary with the most important terms for the whole corpus of text based on GraFS
-    :param author_id: the author_id
-    :returns: a list of unique terms
+
+def _get_texts_of_papers(input_dir, shas, store=None):
+    """Get the texts of many papers, from the packed store of the papers if it is given.
+
+    :param input_dir: the input directory that contains the dataset directory of the papers
+    :param shas: the filenames of the papers
+    :param store: the packed store of the texts of the papers
+    :returns: a list of texts
+    """
+    if store is not None:
+        return store.texts(shas)
+    return [_get_text_from_paper_file(input_dir, sha) for sha in shas]
+
+
+def _pack_papers(input_dir, dirpath):
+    """Pack the texts of all papers of the dataset directory, and their token ids, in a store.
+
+    :param input_dir: the input directory that contains the dataset directory of the papers
+    :param dirpath: the directory of the store
     """
-    result = select.get_author_filenames(database, author_id)
-    if result is None or len(result) == 0:
-        return []
-
-    author_filenames = result[0][1]
-    important_terms = set()
-    for sha in author_filenames:
-        with open(f'{input_dir}/dataset/{sha}.json') as f:
+    shas = sorted(filename[:-len('.json')] for filename in os.listdir(f'{input_dir}/dataset')
+                  if filename.endswith('.json'))
+    items = ((sha, _get_text_from_paper_file(input_dir, sha)) for sha in tqdm(shas))
+    pack_texts(dirpath, items, tokenize=_tokenize)
+
+
+class AuthorTermIndex:
+    """The unique terms of the papers of every author, interned as integer ids.
+
+    The filenames of the authors are fetched in bulk, and each paper is parsed once,
+    so that the terms of the authors, restricted to any feature vocabulary, are derived
+    by intersection with its term ids, without reading the papers or querying the database again.
+    The term ids of the authors are kept in compressed sparse row arrays:
+    the terms of the author of row i are term_ids[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, words, authors, offsets, term_ids, filenames):
+        self.vocabulary = Vocabulary(words)
+        self.authors = np.asarray(authors, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.term_ids = np.asarray(term_ids, dtype=np.uint32)
+        self.filenames = filenames
+        self.rows = {author_id: row for row, author_id in enumerate(self.authors.tolist())}
+
+    def __len__(self):
+        return len(self.authors)
+
+    @classmethod
+    def build(cls, database, input_dir, store=None, author_ids=None):
+        """Build the index of the given authors, or of all authors that have written a paper.
+
+        :param database: the database connector
+        :param input_dir: the input directory that contains the dataset directory of the papers
+        :param store: the packed store of the texts of the papers, whose token ids are used if it is given
+        :param author_ids: the author ids, whose filenames are retrieved in batches, or None for all authors
+        :returns: the index
+        """
+        if author_ids is None:
+            authors_filenames = select.get_authors_filenames(database)
+        else:
+            authors_filenames = select.get_authors_filenames_batch(database, author_ids).items()
+        vocabulary = Vocabulary(store.words if store is not None else ())
+        paper_terms = {}
+        authors, offsets, term_ids, filenames = [], [0], [], {}
+        for author_id, author_filenames in tqdm(authors_filenames):
+            terms = set()
+            for sha in author_filenames:
+                if sha not in paper_terms and store is not None:
+                    paper_terms[sha] = set(store.token_ids(sha).tolist())
+                elif sha not in paper_terms:
+                    tokens = _tokenize(_get_text_from_paper_file(input_dir, sha))
+                    paper_terms[sha] = {vocabulary.add(token) for token in tokens}
+                terms |= paper_terms[sha]
+            authors.append(author_id)
+            term_ids.extend(sorted(terms))
+            offsets.append(len(term_ids))
+            filenames[author_id] = author_filenames
+        return cls(vocabulary.words, authors, offsets, term_ids, filenames)
+
+    def save(self, dirpath):
+        """Save the index in a directory.
+
+        :param dirpath: the directory of the index
+        """
+        dirpath = Path(dirpath)
+        dirpath.mkdir(parents=True, exist_ok=True)
+        with open(dirpath / 'index.json', 'w', encoding='utf-8') as f:
+            json.dump({'words': self.vocabulary.words, 'filenames': list(self.filenames.items())}, f)
+        np.savez(dirpath / 'index.npz', authors=self.authors, offsets=self.offsets, term_ids=self.term_ids)
+
+    @classmethod
+    def load(cls, dirpath):
+        """Load an index from a directory.
+
+        :param dirpath: the directory of the index
+        :returns: the index
+        """
+        dirpath = Path(dirpath)
+        with open(dirpath / 'index.json', encoding='utf-8') as f:
             data = json.load(f)
-            title = data['metadata']['title']
-            abstract = ' '.join([t['text'] for t in data['abstract']])
-        text = title + ' ' + abstract
-        text = text.lower()
-        tokens = text.split()
-        for token in tokens:
-            if token in vocabulary:
-                important_terms.add(token)
-    return list(important_terms)
-
-
-def _calculate_similarities(database, vocabulary: set, df, input_dir):
+        arrays = np.load(dirpath / 'index.npz')
+        return cls(data['words'], arrays['authors'], arrays['offsets'], arrays['term_ids'], dict(data['filenames']))
+
+    def term_matrix(self, vocabulary: set):
+        """Create the binary author x term matrix of the important terms of each author.
+
+        :param vocabulary: the vocabulary with the most important terms for the whole corpus of text based on GraFS
+        :returns: a sparse matrix, whose row i holds the terms of the author of row i,
+            and an extra empty last row, for the authors without papers
+        """
+        vocabulary_ids = np.array(
+            [self.vocabulary.ids[term] for term in vocabulary if term in self.vocabulary], dtype=np.uint32
+        )
+        important = np.isin(self.term_ids, vocabulary_ids)
+        rows = np.repeat(np.arange(len(self.authors)), np.diff(self.offsets))
+        counts = np.bincount(rows[important], minlength=len(self.authors) + 1)
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        indices = self.term_ids[important]
+        return csr_matrix(
+            (np.ones(len(indices), dtype=np.int32), indices, indptr),
+            shape=(len(self.authors) + 1, len(self.vocabulary)),
+        )
+
+    def author_rows(self, author_ids):
+        """Map author ids to the rows of the term matrix.
+
+        :param author_ids: the author ids
+        :returns: an array of rows, where the authors without papers are mapped to the empty last row
+        """
+        return np.array([self.rows.get(author_id, len(self.authors)) for author_id in author_ids], dtype=np.int64)
+
+
+def _calculate_similarities(term_index, vocabulary: set, df):
     """Calculate the similarity between the two authors of each row of the given dataframe.
 
     The similarity score is based on the Jaccard index.
 
-    :param database: the database connector
+    :param term_index: the author term index
     :param vocabulary: the vocabulary with the most important terms for the whole corpus of text based on GraFS
     :returns: a list of similarity scores
     """
-    similarities = []
-    for _, row in tqdm(df.iterrows(), total=df.shape[0]):
-        author_id1 = int(row['node1'])
-        author_id2 = int(row['node2'])
+    matrix = term_index.term_matrix(vocabulary)
+    rows1 = term_index.author_rows(df['node1'].astype(int).tolist())
+    rows2 = term_index.author_rows(df['node2'].astype(int).tolist())
+    return utils.jaccard_similarity_batch(matrix, rows1, rows2).tolist()
+
+
+# The read-only state of the jobs, which is set once in each worker process.
+_shared = {}
+
+
+def _init_worker(input_dir, term_index, paper_store):
+    """Set the shared state of the jobs of a process.
+
+    :param input_dir: the input directory that contains the dataset directory of the papers
+    :param term_index: the author term index
+    :param paper_store: the directory of the packed store of the texts of the papers, or None
+    """
+    _shared['input_dir'] = input_dir
+    _shared['term_index'] = term_index
+    _shared['store'] = TextStore(paper_store) if paper_store else None
+
+
+def _tfidf_similarities(train_df, test_df):
+    """Calculate the similarities of the train and test pairs, based on the tfidf features of the train corpus.
+
+    :param train_df: the train dataframe
+    :param test_df: the test dataframe
+    :returns: the train and the test similarity scores
+    """
+    term_index = _shared['term_index']
+    # Create a corpus of files for the tfidf feature selection process.
+    corpus = []
+    texts = {}
+    for author_id in pd.concat([train_df['node1'], train_df['node2']], axis=1).astype(int).values.ravel():
+        author_filenames = term_index.filenames.get(author_id, [])
+        missing = [filename for filename in author_filenames if filename not in texts]
+        texts.update(zip(missing, _get_texts_of_papers(_shared['input_dir'], missing, _shared['store'])))
+        corpus.extend(texts[filename] for filename in author_filenames)
+    tfidf_vocabulary = _tfidf_feature_selector(corpus, max_features=2000)
+    return _vocabulary_similarities(tfidf_vocabulary, train_df, test_df)
 
-        author_terms1 = _get_important_terms_of_author(database, vocabulary, author_id1, input_dir)
-        author_terms2 = _get_important_terms_of_author(database, vocabulary, author_id2, input_dir)
 
-        similarities.append(utils.jaccard_similarity(author_terms1, author_terms2))
-    return similarities
+def _vocabulary_similarities(vocabulary: set, train_df, test_df):
+    """Calculate the similarities of the train and test pairs, based on the given vocabulary.
+
+    :param vocabulary: the vocabulary with the most important terms for the whole corpus of text based on GraFS
+    :param train_df: the train dataframe
+    :param test_df: the test dataframe
+    :returns: the train and the test similarity scores
+    """
+    term_index = _shared['term_index']
+    return _calculate_similarities(term_index, vocabulary, train_df), _calculate_similarities(term_index, vocabulary, test_df)
+
+
+def _run_job(job):
+    """Run a job and measure its time.
+
+    :param job: a tuple of the dataset, the field name, the function and its arguments
+    :returns: the dataset, the field name, the train and test similarity scores and the seconds of the job
+    """
+    dataset, field_name, function, arguments = job
+    start = time.perf_counter()
+    similarities = function(*arguments)
+    return dataset, field_name, similarities, time.perf_counter() - start
 
 
 def run(args):
@@ -104,50 +274,78 @@ def run(args):
     filenames_per_community = select.get_communities_filenames(database)
     filenames_per_community = {f[0]: f[1] for f in filenames_per_community}
 
+    # Pack the texts of the papers once, or open the store of a previous run.
+    store = None
+    if args.paper_store:
+        if not TextStore.exists(args.paper_store):
+            _pack_papers(args.input_dir, args.paper_store)
+        store = TextStore(args.paper_store)
+
+    # Index the terms of the authors of all datasets once, or load the index of a previous run,
+    # unless it doesn't contain some of the authors.
+    frames = [(pd.read_csv(train_file), pd.read_csv(test_file)) for train_file, test_file in datasets]
+    author_ids = sorted(set(pd.concat(
+        [df[column] for dfs in frames for df in dfs for column in ['node1', 'node2']]
+    ).astype(int).tolist()))
+    term_index = None
+    if args.term_index and Path(args.term_index, 'index.npz').is_file():
+        term_index = AuthorTermIndex.load(args.term_index)
+        if any(author_id not in term_index.rows for author_id in author_ids):
+            term_index = None
+    if term_index is None:
+        term_index = AuthorTermIndex.build(database, args.input_dir, store, author_ids)
+        if args.term_index:
+            term_index.save(args.term_index)
+
+    # Rank the terms of the communities once (or load the ranking of a previous run of the same graph),
+    # and get the most important terms of each top_n from it.
+    global tags_per_community
+    ranking = CommunityTagRanking.load_or_select(database, args.community_tags)
     top_x = [5, 100, 250]
-    for train_file, test_file in datasets:
-        train_df = pd.read_csv(train_file)
-        test_df = pd.read_csv(test_file)
-
-        # Create a corpus of files for the tfidf feature selection process.
-        corpus = []
-        for _, row in tqdm(train_df.iterrows(), total=train_df.shape[0]):
-            author_id1 = int(row['node1'])
-            result = select.get_author_filenames(database, int(author_id1))
-            if not (result is None or len(result) == 0):
-                author_filenames = result[0][1]
-                for filename in author_filenames:
-                    corpus.append(_get_text_from_paper_file(args.input_dir, filename))
-            author_id2 = int(row['node2'])
-            result = select.get_author_filenames(database, int(author_id2))
-            if not (result is None or len(result) == 0):
-                author_filenames = result[0][1]
-                for filename in author_filenames:
-                    corpus.append(_get_text_from_paper_file(args.input_dir, filename))
-        tfidf_vocabulary = _tfidf_feature_selector(corpus, max_features=2000)
-        train_df['similarity_tfidf'] = _calculate_similarities(database, tfidf_vocabulary, train_df, args.input_dir)
-        test_df['similarity_tfidf'] = _calculate_similarities(database, tfidf_vocabulary, test_df, args.input_dir)
+    vocabularies = {}
+    for top_n in top_x:
+        tags_per_community = ranking.top(top_n)
+        vocabularies[top_n] = set(ranking.features(top_n))
+        for key in tags_per_community.keys():
+            tags_per_community[key] = set(tags_per_community[key])
+    utils.disconnect_from_the_database(database)
 
+    # Create the jobs of the tfidf and the top_n features of each dataset, which are independent.
+    jobs = []
+    for dataset, (train_df, test_df) in enumerate(frames):
+        pairs = (train_df[['node1', 'node2']], test_df[['node1', 'node2']])
+        jobs.append((dataset, 'similarity_tfidf', _tfidf_similarities, pairs))
         for top_n in top_x:
-            global tags_per_community
-            tags_per_community = select.get_communities_tags(database, top_terms=top_n)
-            vocabulary = sum([tags_per_community[key] for key in tags_per_community.keys()], [])
-            vocabulary = set(vocabulary)
-            print('Number of features:%s %s |%s|' % (train_file, top_n, len(vocabulary)))
-            for key in tags_per_community.keys():
-                tags_per_community[key] = set(tags_per_community[key])
-            field_name = f'similarity_top_{top_n}'
-            print(train_file, top_n)
-            train_df[field_name] = _calculate_similarities(database, vocabulary, train_df, args.input_dir)
-            print(test_file, top_n)
-            test_df[field_name] = _calculate_similarities(database, vocabulary, test_df, args.input_dir)
-
-        train_file = train_file.replace('.csv', '_enriched.csv')
-        train_df.to_csv(train_file)
-        test_file = test_file.replace('.csv', '_enriched.csv')
-        test_df.to_csv(test_file)
-    utils.disconnect_from_the_database(database)
+            print('Number of features:%s %s |%s|' % (datasets[dataset][0], top_n, len(vocabularies[top_n])))
+            jobs.append((dataset, f'similarity_top_{top_n}', _vocabulary_similarities, (vocabularies[top_n], *pairs)))
 
+    results = {}
+    start = time.perf_counter()
+    initargs = (args.input_dir, term_index, args.paper_store)
+    if args.workers > 1:
+        # The shared state is sent to each worker once, when it starts.
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=initargs) as executor:
+            futures = [executor.submit(_run_job, job) for job in jobs]
+            for future in as_completed(futures):
+                dataset, field_name, similarities, seconds = future.result()
+                results[dataset, field_name] = similarities
+                print(f'{datasets[dataset][0]} {field_name}: {seconds:.2f} sec')
+    else:
+        _init_worker(*initargs)
+        for job in jobs:
+            dataset, field_name, similarities, seconds = _run_job(job)
+            results[dataset, field_name] = similarities
+            print(f'{datasets[dataset][0]} {field_name}: {seconds:.2f} sec')
+    print(f'All jobs: {time.perf_counter() - start:.2f} sec')
+
+    # Add the features in the same order as the serial execution, and write the enriched datasets.
+    field_names = ['similarity_tfidf'] + [f'similarity_top_{top_n}' for top_n in top_x]
+    for dataset, (train_df, test_df) in enumerate(frames):
+        for field_name in field_names:
+            train_df[field_name], test_df[field_name] = results[dataset, field_name]
+        train_file, test_file = datasets[dataset]
+        train_df.to_csv(train_file.replace('.csv', '_enriched.csv'))
+        test_df.to_csv(test_file.replace('.csv', '_enriched.csv'))
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -161,6 +359,34 @@ if __name__ == '__main__':
         type=str,
         required=True,
     )
+    parser.add_argument(
+        "--term-index",
+        help="Directory of the author term index, which is built and saved there on the first run and loaded afterwards",
+        dest="term_index",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--paper-store",
+        help="Directory of the packed texts of the papers, which are packed there on the first run and read afterwards",
+        dest="paper_store",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--community-tags",
+        help="File of the ranking of the community terms, which is selected and saved there when the graph changes",
+        dest="community_tags",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of processes that calculate the features of the datasets in parallel, 1 runs them serially",
+        dest="workers",
+        type=int,
+        default=1,
+    )
     args = parser.parse_args()
 
     run(args)
@@ -0,0 +1,53 @@
+"""
+Tests of the equivalence of generate_words_batch with generate_words,
+on a sample of jira-like texts, for every combination of their options.
+"""
+import itertools
+import pytest
+
+pytest.importorskip('neo4j')
+nltk = pytest.importorskip('nltk')
+for resource in ['corpora/stopwords', 'corpora/wordnet', 'tokenizers/punkt', 'taggers/averaged_perceptron_tagger']:
+    try:
+        nltk.data.find(resource)
+    except LookupError:
+        pytest.skip(f'The nltk resource {resource} is not installed.', allow_module_level = True)
+
+from GraphOfDocs_Representation.utils import generate_words, generate_words_batch
+
+texts = [
+    # End of sentences, which are tracked by the e5c sentinel.
+    'NPE in DataNode on startup. The block report fails! Is it related to HDFS-1234? See the logs.',
+    'Sentences without spaces.after the dot!or the mark?like this. And the last one.',
+    # Contractions, which are split by the tokenizer, with and without apostrophes.
+    "We cannot merge it, we're gonna revert. I wanna test it first, gimme a minute, lemme see.",
+    "Don't, can't, won't, shouldn't've, y'all, it's Cannot GONNA Wanna gotta.",
+    # Unicode quotes and non-ascii characters.
+    'The option «fs.defaultFS» is “deprecated” in ‘core-site.xml’ „since” 2.0 – use fs.default.name » instead.',
+    'Übergröße café naïve résumé 日本語 emoji 🙂 in the description.',
+    # Unspaced unicode dashes, which the newer versions of nltk separate from the words.
+    'The range a–b, foo—bar, α–β and x‒y―z; em—dash at the end—',
+    'Ελληνικά–κείμενα and кириллица—текст with «guillemets»–dashes…',
+    # Code, paths, urls and stack traces.
+    'java.lang.NullPointerException\n\tat org.apache.hadoop.hdfs.DataNode.run(DataNode.java:123)\n\tat Thread.run',
+    'Set `dfs.replication=3` in /etc/hadoop/conf/hdfs-site.xml, see https://issues.apache.org/jira/browse/HDFS-42.',
+    '{code}for (int i = 0; i < 10; i++) { x += i; }{code} returns 45 instead of 55...',
+    # Numbers, short tokens and whitespace.
+    '1 22 333 4444 a bb ccc dddd 3.14 1e10 0x1F   \t\n  multiple   spaces\r\nand lines',
+    '',
+    'e5c e5c. e5c! ?',
+]
+
+options = [
+    dict(zip(['extend_window', 'insert_stopwords', 'lemmatize', 'stem'], values))
+    for values in itertools.product([False, True], repeat = 4)
+]
+
+@pytest.mark.parametrize('option', options, ids = lambda option: '-'.join(
+    name for name, value in option.items() if value) or 'default')
+def test_generate_words_batch(option):
+    assert generate_words_batch(texts, **option) == [generate_words(text, **option) for text in texts]
+
+def test_generate_words_batch_of_single_texts():
+    for text in texts:
+        assert generate_words_batch([text]) == [generate_words(text)]
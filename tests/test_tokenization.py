@@ -0,0 +1,38 @@
+"""
+Tests of the equivalence of the fast tokenization with the tokenizer of word_tokenize,
+on the normalized texts of generate_words, which don't need the corpora of nltk.
+"""
+import pytest
+
+pytest.importorskip('nltk')
+
+from GraphOfDocs_Representation.tokenization import (
+    fast_tokenizer_matches, fast_word_tokenize, preprocess_text, split_words, word_tokenizer
+)
+
+texts = [
+    'NPE in DataNode on startup. The block report fails! Is it related to HDFS-1234? See the logs.',
+    "We cannot merge it, we're gonna revert. I wanna test it first, gimme a minute, lemme see.",
+    'The option «fs.defaultFS» is “deprecated” in ‘core-site.xml’ „since” 2.0 – use fs.default.name » instead.',
+    # Unspaced unicode dashes, which the newer versions of nltk separate from the words.
+    'The range a–b, foo—bar, α–β and x‒y―z; em—dash at the end—',
+    'Ελληνικά–κείμενα and кириллица—текст with «guillemets»–dashes…',
+    'Übergröße café naïve résumé 日本語 emoji 🙂 in the description.',
+    'java.lang.NullPointerException\n\tat org.apache.hadoop.hdfs.DataNode.run(DataNode.java:123)',
+    '1 22 333 a bb ccc 3.14 1e10   \t\n  multiple   spaces\r\nand lines wanna',
+    '',
+]
+
+def test_fast_tokenizer_is_used():
+    # The rules of split_words have to be updated, if they don't match the installed version of nltk.
+    assert fast_tokenizer_matches
+
+@pytest.mark.parametrize('extend_window', [False, True])
+def test_split_words(extend_window):
+    for text in texts:
+        text = preprocess_text(text, extend_window)
+        assert split_words(text) == word_tokenizer.tokenize(text)
+        assert fast_word_tokenize(text) == word_tokenizer.tokenize(text)
+
+def test_unspaced_dashes():
+    assert fast_word_tokenize(preprocess_text('a–b foo—bar')) == word_tokenizer.tokenize('a–b foo—bar')